@@ -0,0 +1,63 @@
+# 試算表日期時間解析 micro-benchmark：逐格嘗試 strptime（_parse_dt）與依欄位推斷格式的 ColumnDateParser
+#
+#   python bench/bench_datetime_parse.py [--outbound 3000] [--repeat 5]
+#
+# 先確認兩者對每一格的結果相同；「冷」為每輪清空字串快取（等同重啟後第一次完整同步），「熱」則保留快取。
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import main                      # noqa: E402
+import upstream_fixtures as fx   # noqa: E402
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--outbound", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    values = fx.hospital_sheets(args.outbound, 0)[main.HOSPITAL_SHEETS[0][0]]
+    header, rows = values[0], values[1:]
+    col = {h: i for i, h in enumerate(header)}
+    columns = {name: [row[col[name]] for row in rows] for name in main.DT_COLUMNS}
+    cells = sum(len(v) for v in columns.values())
+
+    for name, cells_ in columns.items():
+        p = main.ColumnDateParser(cells_)
+        for val in cells_:
+            if p.parse(val) != main._parse_dt(val):
+                raise SystemExit(f"解析結果不一致：{name} {val!r}")
+
+    def legacy():
+        for cells_ in columns.values():
+            for val in cells_:
+                main._parse_dt(val)
+
+    def inferred(clear_cache: bool):
+        if clear_cache:
+            main._dt_cache.clear()
+        for cells_ in columns.values():
+            p = main.ColumnDateParser(cells_[:main.DT_SAMPLE_SIZE])
+            for val in cells_:
+                p.parse(val)
+
+    def timed(fn):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            fn()
+        return (time.perf_counter() - start) / args.repeat * 1000
+
+    legacy_ms = timed(legacy)
+    cold_ms   = timed(lambda: inferred(True))
+    warm_ms   = timed(lambda: inferred(False))
+    print(f"{len(rows)} 列 × {len(columns)} 欄 = {cells} 格，重複 {args.repeat} 次")
+    print(f"逐格 strptime        {legacy_ms:>8.2f} ms")
+    print(f"欄位推斷（冷快取）   {cold_ms:>8.2f} ms   {legacy_ms / cold_ms:>5.1f}x")
+    print(f"欄位推斷（熱快取）   {warm_ms:>8.2f} ms   {legacy_ms / warm_ms:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main_()
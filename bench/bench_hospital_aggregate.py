@@ -0,0 +1,74 @@
+# 醫院彙總 micro-benchmark：以產生的試算表資料量測完整重建、增量新增與車程分析查詢的耗時
+#
+#   python bench/bench_hospital_aggregate.py [--outbound 3000] [--transfer 1500] [--repeat 5] [--append 20]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import main                      # noqa: E402
+import upstream_fixtures as fx   # noqa: E402
+
+
+def build(sheets, upto=None):
+    agg = main.HospitalAggregate()
+    for title, hosp_col_name, mission_type in main.HOSPITAL_SHEETS:
+        values = sheets[title]
+        rows = values[1:] if upto is None else values[1:upto]
+        agg.add_rows(values[0], rows, hosp_col_name, mission_type)
+    return agg, agg.result()
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--outbound", type=int, default=3000)
+    parser.add_argument("--transfer", type=int, default=1500)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--append", type=int, default=20)
+    args = parser.parse_args()
+
+    sheets = fx.hospital_sheets(args.outbound, args.transfer)
+    print(f"資料：外接 {args.outbound} 列、轉出 {args.transfer} 列，重複 {args.repeat} 次")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        _, result = build(sheets)
+    full_ms = (time.perf_counter() - start) / args.repeat * 1000
+    print(f"完整重建       {full_ms:>9.2f} ms   （{result['stats']['total_hospitals']} 家醫院）")
+
+    # 增量：先彙總到倒數 append 列，再只加入最後幾列
+    title, hosp_col_name, mission_type = main.HOSPITAL_SHEETS[0]
+    values = sheets[title]
+    cut = len(values) - args.append
+    total = 0.0
+    for _ in range(args.repeat):
+        agg, _ = build(sheets, upto=cut)
+        start = time.perf_counter()
+        agg.add_rows(values[0], values[cut:], hosp_col_name, mission_type)
+        agg.result()
+        total += time.perf_counter() - start
+    print(f"增量新增 {args.append:>3} 列 {total / args.repeat * 1000:>9.2f} ms")
+
+    start = time.perf_counter()
+    analytics = main.MissionAnalytics(result, values[0], values[1:])
+    print(f"車程分析建立   {(time.perf_counter() - start) * 1000:>9.2f} ms   （{len(analytics.go)} 筆有效任務）")
+    filters = {"hospital": None, "county": None, "year": None, "month": None, "hour": None}
+    for label, flt, group_by in (("全部", {}, None), ("依縣市+年份", {"county": "花蓮縣", "year": 2024}, None),
+                                 ("依時段分組", {}, "hour"), ("依醫院分組", {}, "hospital")):
+        start = time.perf_counter()
+        for _ in range(args.repeat * 20):
+            analytics.query({**filters, **flt}, group_by)
+        print(f"查詢：{label:<10} {(time.perf_counter() - start) / (args.repeat * 20) * 1000:>6.2f} ms")
+
+    start = time.perf_counter()
+    cells = [row[i] for row in values[1:] for i in (6, 7, 8)]
+    for _ in range(args.repeat):
+        for cell in cells:
+            main._parse_dt(cell)
+    per_cell = (time.perf_counter() - start) / (args.repeat * len(cells)) * 1e6
+    print(f"_parse_dt      {per_cell:>9.2f} µs/格（{len(cells)} 格）")
+
+
+if __name__ == "__main__":
+    main_()
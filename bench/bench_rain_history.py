@@ -0,0 +1,55 @@
+# 雨量時序 micro-benchmark：把每個測站、欄位的環狀緩衝寫滿後，量測記憶體用量、記錄與查詢的耗時
+#
+#   python bench/bench_rain_history.py [--hours 72] [--repeat 200]
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import main                      # noqa: E402
+
+
+def samples(start: int, count: int, seed: int = 7):
+    # 每 10 分鐘一筆、跨過容量一輪以上，驗證覆寫
+    rng = random.Random(seed)
+    for k in range(count):
+        yield {label: {"station": f"C{i:04d}", "obs": start + k * 600,
+                       "values": {"Past10Min": rng.choice((0.0, 0.0, 0.5, 1.5, 4.0)),
+                                  "Past1hr": round(rng.uniform(0, 30), 1), "Past24hr": round(rng.uniform(0, 300), 1)}}
+               for i, (_, _, label) in enumerate(main.RAIN_TARGETS)}
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=int, default=main.RAIN_HISTORY_HOURS)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    capacity = args.hours * 6
+    batches = list(samples(1_760_000_000, capacity * 2))
+    tracemalloc.start()
+    history = main.RainHistory(os.devnull, capacity)
+    start = time.perf_counter()
+    for found in batches:
+        history.record(found)
+    record_us = (time.perf_counter() - start) / len(batches) * 1e6
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ring = next(iter(history.rings.values()))
+    print(f"{len(history.rings)} 個緩衝 × {capacity} 筆（{args.hours} 小時），已寫入 {len(batches)} 輪")
+    print(f"每個緩衝 {ring.times.itemsize * capacity + ring.values.itemsize * capacity:>8} bytes，"
+          f"總計約 {used / 1024:.1f} KiB（tracemalloc）")
+    print(f"記錄一輪        {record_us:>8.2f} µs")
+    for hours, step in ((24, 30), (args.hours, 60), (6, 10)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            history.query(hours, step)
+        print(f"查詢 {hours:>3}h / {step:>2} 分 {(time.perf_counter() - start) / args.repeat * 1000:>8.3f} ms")
+
+
+if __name__ == "__main__":
+    main_()
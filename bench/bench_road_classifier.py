@@ -0,0 +1,108 @@
+# 路況分類器 micro-benchmark：以錄製的 TDX 新聞語料比較舊版逐一 `kw in content` 與單次掃描的編譯版
+#
+#   python bench/bench_road_classifier.py [--repeat 200] [--extra-keywords 0,100,400]
+#
+# 會先確認兩種實作對每筆新聞的分類結果完全一致，再分別計時。
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import main  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "tdx_news_highway.json")
+
+
+def legacy_classify(title, desc, sections, high_risk_kw, mid_risk_kw, partial_kw,
+                    downgrade_kw, new_suhua_lmk, new_suhua_km):
+    # 與改版前 get_suhua_road_data 內的判斷邏輯相同
+    if not ("台9" in (title + desc) or "蘇花" in (title + desc)):
+        return None
+    content = f"{title}：{desc}"
+    if not desc:
+        return None
+
+    status = "事件"; css_class = "road-yellow"; is_high = False
+    for kw in high_risk_kw:
+        if kw in content:
+            status = kw; css_class = "road-red"; is_high = True; break
+    if not is_high:
+        for kw in mid_risk_kw:
+            if kw in content: status = kw; break
+    if is_high:
+        if any(k in content for k in partial_kw):
+            status = f"管制（{status}單線）"; css_class = "road-yellow"
+        elif any(k in content for k in downgrade_kw):
+            status = f"管制（{status}改道）"; css_class = "road-yellow"
+
+    is_old = False
+    if not any(lmk in content for lmk in new_suhua_lmk):
+        km_m = re.search(r'(\d+\.?\d*)[Kk]', content)
+        if km_m:
+            try:
+                km = float(km_m.group(1))
+                is_old = not any(lo <= km <= hi for lo, hi in new_suhua_km)
+            except ValueError:
+                is_old = "台9丁" in content
+        else:
+            is_old = "台9丁" in content
+
+    section = "其他蘇花路段"
+    for sname, keywords in sections.items():
+        if any(kw in content for kw in keywords):
+            section = sname; break
+    return {"section": section, "status": status, "class": css_class, "is_old_road": is_old}
+
+
+def grown_sections(extra: int):
+    # 模擬關鍵字表擴充：每個路段加入 extra 個不會命中的地名
+    sections = {name: list(kws) for name, kws in main.ROAD_SECTIONS.items()}
+    for i in range(extra):
+        name = list(sections)[i % len(sections)]
+        sections[name].append(f"測試地名{i:04d}號")
+    return sections
+
+
+def timed(fn, corpus, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for title, desc in corpus:
+            fn(title, desc)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(corpus)) * 1e6
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--extra-keywords", default="0,100,400")
+    args = parser.parse_args()
+
+    with open(FIXTURE, encoding="utf-8") as f:
+        newses = json.load(f)["Newses"]
+    corpus = [(n.get("Title", ""), n.get("Description", "")) for n in newses]
+    print(f"語料：{len(corpus)} 筆新聞，重複 {args.repeat} 次")
+    print(f"{'額外關鍵字':>10} {'舊版 µs/筆':>12} {'編譯版 µs/筆':>14} {'加速':>8}")
+
+    for extra in (int(x) for x in args.extra_keywords.split(",")):
+        sections = grown_sections(extra)
+        tables = (sections, main.HIGH_RISK_KW, main.MID_RISK_KW, main.PARTIAL_KW,
+                  main.DOWNGRADE_KW, main.NEW_SUHUA_LMK, main.NEW_SUHUA_KM)
+        classifier = main.RoadNewsClassifier(*tables)
+
+        for title, desc in corpus:
+            expected = legacy_classify(title, desc, *tables)
+            got = classifier.classify(title, desc)
+            if expected != got:
+                raise SystemExit(f"分類結果不一致：{title} → {expected} vs {got}")
+
+        legacy_us   = timed(lambda t, d: legacy_classify(t, d, *tables), corpus, args.repeat)
+        compiled_us = timed(classifier.classify, corpus, args.repeat)
+        print(f"{extra:>10} {legacy_us:>12.2f} {compiled_us:>14.2f} {legacy_us / compiled_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main_()
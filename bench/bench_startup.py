@@ -0,0 +1,59 @@
+# 啟動成本：在新的 process 中 import main，量測耗時與峰值 RSS
+#
+#   python bench/bench_startup.py [--repeat 7]
+#
+# 「lazy」為目前行為（不使用醫院資料的 process 不會載入 gspread / google-auth），
+# 「eager」在 import main 前先載入 Sheets 相關模組，等同改版前於模組層級 import 的成本。
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+if {eager}:
+    import gspread
+    from google.oauth2.service_account import Credentials
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  "gspread_loaded": "gspread" in sys.modules}}))
+"""
+
+
+def measure(eager: bool, repeat: int) -> dict:
+    env = {**os.environ, "DATA_DIR": tempfile.mkdtemp(prefix="bench-startup-")}
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(eager=eager)], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        "ms":     statistics.median(r["seconds"] for r in runs) * 1000,
+        "rss_mb": statistics.median(r["rss_kb"] for r in runs) / 1024,
+        "gspread_loaded": runs[-1]["gspread_loaded"],
+    }
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'模式':<8} {'import ms':>10} {'峰值 RSS MB':>12}  gspread 已載入")
+    results = {}
+    for name, eager in (("eager", True), ("lazy", False)):
+        results[name] = r = measure(eager, args.repeat)
+        print(f"{name:<8} {r['ms']:>10.1f} {r['rss_mb']:>12.1f}  {r['gspread_loaded']}")
+    print(f"差異     {results['eager']['ms'] - results['lazy']['ms']:>10.1f} "
+          f"{results['eager']['rss_mb'] - results['lazy']['rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main_()
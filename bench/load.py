@@ -0,0 +1,146 @@
+# 離線壓測：啟動 stub 上游與 main.py，對各 API 併發送出請求，回報 p50/p95/p99、吞吐量與 app 的峰值 RSS
+#
+#   python bench/load.py [--concurrency 50] [--requests 2000] [--scenarios dashboard,hospital,...]
+#                        [--latency 0.02] [--slow-rate 0.05] [--slow-latency 2] [--error-rate 0.02]
+#
+# 上游的延遲與錯誤只影響背景更新；每個情境的請求數與併發數相同，方便前後比較。
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = {
+    "dashboard":    ("GET",  "/api/dashboard-data", None),
+    "hospital":     ("GET",  "/api/hospital-data",  None),
+    "radar-image":  ("GET",  "/api/radar-image",    None),
+    "rainfall-map": ("GET",  "/api/rainfall-map",   None),
+    "line-notify":  ("POST", "/api/line-notify",    {"hospital": "花蓮慈濟醫院", "task_type": "外接",
+                                                     "time_str": "10:30", "notes": "壓測",
+                                                     "dashboard_url": "https://example.com/dashboard"}),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def peak_rss_mb(pid: int) -> float:
+    # Linux：VmHWM 為 process 的峰值常駐記憶體
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def percentile(sorted_vals, q: float) -> float:
+    if not sorted_vals:
+        return float("nan")
+    idx = min(len(sorted_vals) - 1, max(0, round(q / 100 * (len(sorted_vals) - 1))))
+    return sorted_vals[idx]
+
+
+async def wait_ready(base: str, path: str = "/", timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(base + path)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise SystemExit(f"{base} 未在 {timeout} 秒內就緒")
+
+
+async def run_scenario(client: httpx.AsyncClient, base: str, method: str, path: str, body,
+                       total: int, concurrency: int) -> dict:
+    latencies, statuses = [], {}
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                r = await client.request(method, base + path, json=body)
+                await r.aread()
+                key = r.status_code
+            except httpx.HTTPError as e:
+                key = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[key] = statuses.get(key, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "p50": percentile(latencies, 50) * 1000, "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000, "rps": total / elapsed, "statuses": statuses,
+    }
+
+
+async def drive(args, app_base: str, app_pid: int):
+    await wait_ready(app_base)
+    # 等背景排程完成第一輪更新，量測的是穩態
+    async with httpx.AsyncClient(timeout=60) as client:
+        await client.get(app_base + "/api/hospital-data")
+        await asyncio.sleep(args.warmup)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    print(f"併發 {args.concurrency}，每個情境 {args.requests} 個請求")
+    print(f"{'情境':<14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>9}  狀態碼")
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        for name in args.scenarios.split(","):
+            method, path, body = SCENARIOS[name]
+            res = await run_scenario(client, app_base, method, path, body, args.requests, args.concurrency)
+            statuses = " ".join(f"{k}×{v}" for k, v in sorted(res["statuses"].items(), key=str))
+            print(f"{name:<14} {res['p50']:>8.2f} {res['p95']:>8.2f} {res['p99']:>8.2f} {res['rps']:>9.1f}  {statuses}")
+    print(f"app 峰值 RSS：{peak_rss_mb(app_pid):.1f} MB")
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--latency", default="0.02")
+    parser.add_argument("--slow-rate", default="0.0")
+    parser.add_argument("--slow-latency", default="2.0")
+    parser.add_argument("--error-rate", default="0.0")
+    args = parser.parse_args()
+
+    stub_port, app_port = free_port(), free_port()
+    upstream = f"http://127.0.0.1:{stub_port}"
+    stub = subprocess.Popen([sys.executable, os.path.join(HERE, "stub_upstream.py"), "--port", str(stub_port),
+                             "--latency", args.latency, "--slow-rate", args.slow_rate,
+                             "--slow-latency", args.slow_latency, "--error-rate", args.error_rate])
+    app = subprocess.Popen([sys.executable, os.path.join(HERE, "serve_app.py"), "--port", str(app_port),
+                            "--upstream", upstream], stdout=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_ready(upstream, "/_stats"))
+        asyncio.run(drive(args, f"http://127.0.0.1:{app_port}", app.pid))
+        print("上游呼叫次數：", httpx.get(upstream + "/_stats").json())
+    finally:
+        for proc in (app, stub):
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,75 @@
+# 以 stub 上游啟動 main.py（單一 worker），供 bench/load.py 壓測
+#
+#   python bench/serve_app.py --port 9200 --upstream http://127.0.0.1:9100
+#
+# 上游位址以環境變數指向 stub；Google Sheets 改由 stub 的 /sheets/<工作表> 提供（gspread 無法改位址）。
+import argparse
+import os
+import sys
+import tempfile
+
+import httpx
+
+
+class StubWorksheet:
+    def __init__(self, upstream: str, title: str):
+        self.upstream = upstream
+        self.title    = title
+        self._values  = None
+
+    def get_all_values(self):
+        r = httpx.get(f"{self.upstream}/sheets/{self.title}", timeout=30)
+        r.raise_for_status()
+        self._values = r.json()
+        return self._values
+
+    @property
+    def row_count(self):
+        return len(self._values if self._values is not None else self.get_all_values())
+
+    def batch_get(self, ranges):
+        # 只支援 main.py 用到的「列號:列號」格式
+        values = self.get_all_values()
+        out = []
+        for rng in ranges:
+            first, last = (int(x) for x in rng.split(":"))
+            out.append(values[first - 1:last])
+        return out
+
+
+class StubSpreadsheet:
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+
+    def worksheet(self, title: str):
+        return StubWorksheet(self.upstream, title)
+
+
+def configure(upstream: str):
+    os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bench-app-"))
+    os.environ.setdefault("GOOGLE_SERVICE_ACCOUNT_JSON", "{}")
+    os.environ.setdefault("LINE_CHANNEL_TOKEN", "bench")
+    for name in ("CWA_API_BASE", "CWA_WEB_BASE", "RAINFALL_MAP_MIRROR", "TDX_API_BASE", "LINE_API_BASE", "TINYURL_BASE"):
+        os.environ[name] = upstream
+    # stub 只有 HTTP/1.1 明文
+    os.environ.setdefault("HTTP2_ENABLED", "0")
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+    import main
+    main._open_hospital_sheet = lambda: StubSpreadsheet(upstream)
+    return main
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--upstream", default="http://127.0.0.1:9100")
+    args = parser.parse_args()
+    app_module = configure(args.upstream)
+
+    import uvicorn
+    uvicorn.run(app_module.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main_()
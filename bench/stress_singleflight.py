@@ -0,0 +1,89 @@
+# Single-flight 壓力測試：資料尚未就緒時同時湧入 N 個請求，確認每個來源只向上游抓一次
+#
+#   python bench/stress_singleflight.py [--callers 200] [--latency 0.2]
+#
+# 以計數用的假 loader 取代真正的上游（不連網），每個情境結束後檢查上游呼叫次數必須為 1。
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("GOOGLE_SERVICE_ACCOUNT_JSON", "{}")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="singleflight-"))
+import httpx  # noqa: E402
+import main   # noqa: E402
+
+
+class Upstream:
+    def __init__(self, latency: float, result):
+        self.latency = latency
+        self.result  = result
+        self.calls   = 0
+
+    async def __call__(self, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.result() if callable(self.result) else self.result
+
+
+def check(name: str, upstream: Upstream, callers: int):
+    ok = upstream.calls == 1
+    print(f"{name:<28} {callers:>6} 個呼叫端 → 上游 {upstream.calls} 次  {'OK' if ok else 'FAIL'}")
+    return ok
+
+
+async def run(callers: int, latency: float) -> bool:
+    results = []
+
+    # 1. 每個資料源的 refresh（排程與請求端同時觸發）
+    for name, feed in main.FEEDS.items():
+        upstream = Upstream(latency, {"feed": name})
+        feed.loader, feed.data = upstream, None
+        await asyncio.gather(*(feed.refresh() for _ in range(callers)))
+        results.append(check(f"feed:{name}", upstream, callers))
+
+    # 2. 冷啟動時的 /api/hospital-data
+    feed = main.FEEDS["hospital"]
+    upstream = Upstream(latency, lambda: {"DB": {}, "TIME_DB": {}, "stats": {}})
+    feed.loader, feed.data = upstream, None
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await asyncio.gather(*(client.get("/api/hospital-data") for _ in range(callers)))
+    results.append(check("GET /api/hospital-data", upstream, callers))
+
+    # 3. 圖片代理（尚無快取時）
+    image = main.radar_image
+    upstream = Upstream(latency, None)
+    image._fetch, image.body = upstream, None
+    await asyncio.gather(*(image.refresh() for _ in range(callers)))
+    results.append(check("image:radar", upstream, callers))
+
+    # 4. TDX token
+    upstream = Upstream(latency, "token")
+    main.tdx_tokens._fetch = upstream
+    main.tdx_tokens.invalidate()
+    await asyncio.gather(*(main.tdx_tokens.get_token() for _ in range(callers)))
+    results.append(check("tdx-token", upstream, callers))
+
+    # 5. 短網址（同一個網址）
+    upstream = Upstream(latency, "https://tinyurl.com/x")
+    main._shorten_url = upstream
+    await asyncio.gather(*(main.shorten_url("https://example.com/a") for _ in range(callers)))
+    results.append(check("tinyurl", upstream, callers))
+
+    return all(results)
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--callers", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+    if not asyncio.run(run(args.callers, args.latency)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main_()
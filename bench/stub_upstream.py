@@ -0,0 +1,159 @@
+# 本機上游 stub：回放 CWA / TDX / LINE / TinyURL / 試算表的回應，可加入延遲、慢回應與錯誤
+#
+#   python bench/stub_upstream.py --port 9100 [--latency 0.02] [--slow-rate 0.05] [--slow-latency 2]
+#                                 [--error-rate 0.02] [--seed 1]
+#
+# 搭配 bench/serve_app.py 把 main.py 的上游位址指到這裡。
+import argparse
+import asyncio
+import hashlib
+import random
+from datetime import datetime, timedelta, timezone
+
+import orjson
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+import upstream_fixtures as fx
+
+TAIPEI = timezone(timedelta(hours=8))
+
+
+class Faults:
+    def __init__(self, latency: float, slow_rate: float, slow_latency: float, error_rate: float, seed: int):
+        self.latency      = latency
+        self.slow_rate    = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate   = error_rate
+        self.rnd          = random.Random(seed)
+        self.counts: dict = {}
+
+    async def apply(self, site: str, error_status: int = 503):
+        # 回傳 None 表示正常，否則為要回的錯誤 Response
+        self.counts[site] = self.counts.get(site, 0) + 1
+        roll = self.rnd.random()
+        await asyncio.sleep(self.slow_latency if roll < self.slow_rate else self.latency)
+        if self.rnd.random() < self.error_rate:
+            return Response(status_code=error_status, headers={"Retry-After": "1"})
+        return None
+
+
+def json_response(payload) -> Response:
+    return Response(orjson.dumps(payload), media_type="application/json")
+
+
+def build_app(faults: Faults) -> FastAPI:
+    app = FastAPI()
+    stations = fx.load_json("cwa_O-A0002-001.json")
+    datasets = {name: fx.load_json(f"cwa_{name}.json") for name in ("F-C0032-001", "E-A0015-001", "T-A0001-001")}
+    news     = fx.load_json("tdx_news_highway.json")
+    sheets   = fx.hospital_sheets()
+    image    = fx.tiny_png()
+    image_etag = '"' + hashlib.md5(image).hexdigest() + '"'
+
+    @app.get("/api/v1/rest/datastore/{dataset}")
+    async def cwa_datastore(dataset: str, request: Request):
+        error = await faults.apply(f"cwa:{dataset}")
+        if error:
+            return error
+        if dataset == "O-A0002-001":
+            wanted = request.query_params.get("StationId")
+            recs = stations["records"]["Station"]
+            if wanted:
+                ids = set(wanted.split(","))
+                recs = [s for s in recs if s["StationId"] in ids]
+            # 觀測時間改成最近的 10 分鐘整點，雨量時序才會逐筆累積
+            now = datetime.now(TAIPEI)
+            obs = now.replace(minute=now.minute - now.minute % 10, second=0, microsecond=0).isoformat()
+            recs = [{**s, "ObsTime": {"DateTime": obs}} for s in recs]
+            return json_response({**stations, "records": {"Station": recs}})
+        if dataset == "E-A0015-001":
+            # 地震時間改成相對於現在，載入器的「三天內」篩選才有資料；timeFrom 與 CWA 一樣篩掉較舊的報告
+            payload = datasets[dataset]
+            now = datetime.now(TAIPEI)
+            time_from = request.query_params.get("timeFrom")
+            since = datetime.fromisoformat(time_from).replace(tzinfo=TAIPEI) if time_from else None
+            quakes = []
+            for i, quake in enumerate(payload["records"]["Earthquake"]):
+                origin = now - timedelta(hours=3 * i)
+                quake["EarthquakeInfo"]["OriginTime"] = origin.strftime("%Y-%m-%d %H:%M:%S")
+                if since is None or origin >= since:
+                    quakes.append(quake)
+            return json_response({**payload, "records": {**payload["records"], "Earthquake": quakes}})
+        if dataset in datasets:
+            return json_response(datasets[dataset])
+        return Response(status_code=404)
+
+    def image_response(request: Request) -> Response:
+        if request.headers.get("if-none-match") == image_etag:
+            return Response(status_code=304, headers={"ETag": image_etag})
+        return Response(image, media_type="image/png", headers={"ETag": image_etag})
+
+    @app.get("/fileapi/v1/opendataapi/{dataset}")
+    async def cwa_file(dataset: str, request: Request):
+        return await faults.apply(f"cwa:{dataset}") or image_response(request)
+
+    @app.get("/Data/radar/{name}")
+    async def cwa_radar(name: str, request: Request):
+        return await faults.apply("cwa:radar") or image_response(request)
+
+    @app.get("/map-data/{name}")
+    async def rainfall_mirror(name: str, request: Request):
+        return await faults.apply("1968:rainfall-map") or image_response(request)
+
+    @app.post("/auth/realms/TDXConnect/protocol/openid-connect/token")
+    async def tdx_token():
+        return await faults.apply("tdx:token") or json_response(
+            {"access_token": "bench-token", "expires_in": 86400, "token_type": "Bearer"})
+
+    @app.get("/api/basic/v2/Road/Traffic/Live/News/Highway")
+    async def tdx_news(request: Request):
+        error = await faults.apply("tdx:news")
+        if error:
+            return error
+        newses = news["Newses"]
+        flt = request.query_params.get("$filter", "")
+        if flt.startswith("UpdateTime gt "):
+            since = flt.removeprefix("UpdateTime gt ")
+            newses = [n for n in newses if n.get("UpdateTime", "") > since]
+        if request.query_params.get("$select") == "NewsID":
+            newses = [{"NewsID": n["NewsID"]} for n in newses]
+        return json_response({**news, "Newses": newses})
+
+    @app.post("/v2/bot/message/push")
+    async def line_push():
+        return await faults.apply("line:push", error_status=429) or json_response({"sentMessages": [{"id": "1"}]})
+
+    @app.get("/api-create.php")
+    async def tinyurl(url: str):
+        error = await faults.apply("tinyurl")
+        if error:
+            return error
+        return Response("https://tinyurl.com/" + hashlib.md5(url.encode()).hexdigest()[:8], media_type="text/plain")
+
+    @app.get("/sheets/{title}")
+    async def sheet_values(title: str):
+        return await faults.apply("sheets") or json_response(sheets.get(title, []))
+
+    @app.get("/_stats")
+    async def stats():
+        return faults.counts
+
+    return app
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    faults = Faults(args.latency, args.slow_rate, args.slow_latency, args.error_rate, args.seed)
+    uvicorn.run(build_app(faults), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main_()
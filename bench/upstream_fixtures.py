@@ -0,0 +1,70 @@
+# 離線測試用的上游資料：CWA / TDX 為 fixtures/ 下的 JSON（與正式 API 相同結構），
+# 醫院試算表以固定亂數種子產生，圖片為最小的合法 PNG
+import json
+import os
+import random
+import struct
+import zlib
+from datetime import datetime, timedelta
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+OUTBOUND_HEADER = ["出勤日期", "出勤縣市", "轉出單位", "轉出院所名稱", "轉出醫院之電話", "對方聯絡人",
+                   "出發時間", "抵達他院時間", "回程時間", "備註"]
+TRANSFER_HEADER = ["出勤日期", "出勤縣市", "轉出單位", "轉回院所名稱", "轉回醫院之電話", "對方聯絡人", "備註"]
+
+HOSPITALS = [
+    ("羅東博愛醫院", "宜蘭縣"), ("羅東聖母醫院", "宜蘭縣"), ("國立陽明交通大學附設醫院", "宜蘭縣"),
+    ("蘇澳榮民醫院", "宜蘭縣"), ("花蓮慈濟醫院", "花蓮縣"), ("門諾醫院", "花蓮縣"),
+    ("部立花蓮醫院", "花蓮縣"), ("國軍花蓮總醫院", "花蓮縣"), ("玉里慈濟醫院", "花蓮縣"),
+    ("臺東馬偕醫院", "臺東縣"), ("部立臺東醫院", "臺東縣"), ("基隆長庚醫院", "基隆市"),
+    ("林口長庚醫院", "桃園市"), ("亞東醫院", "新北市"), ("新竹馬偕醫院", "新竹市"),
+]
+UNITS = ["NICU", "PICU", "新生兒病房", "急診", "兒科病房"]
+
+
+def load_json(name: str):
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def hospital_sheets(outbound_rows: int = 3000, transfer_rows: int = 1500, seed: int = 7) -> dict:
+    # 回傳 {工作表名稱: 含標題列的二維陣列}，格式同 gspread get_all_values
+    rnd = random.Random(seed)
+    start = datetime(2019, 1, 1)
+    span  = (datetime(2026, 10, 1) - start).days
+
+    def base_row(fmt_slash: bool):
+        name, county = rnd.choice(HOSPITALS)
+        day = start + timedelta(days=rnd.randrange(span), hours=rnd.randrange(24), minutes=rnd.randrange(60))
+        date = day.strftime("%Y/%m/%d" if fmt_slash else "%Y-%m-%d")
+        phone = f"0{rnd.randint(2, 8)}-{rnd.randint(1000000, 9999999)}"
+        return day, date, county if rnd.random() > 0.05 else "", rnd.choice(UNITS), name, phone
+
+    outbound = [OUTBOUND_HEADER]
+    for _ in range(outbound_rows):
+        day, date, county, unit, name, phone = base_row(rnd.random() < 0.3)
+        depart = day
+        arrive = depart + timedelta(minutes=rnd.randint(40, 240))
+        back   = arrive + timedelta(minutes=rnd.randint(20, 180))
+        fmt = "%Y-%m-%d %H:%M" if rnd.random() < 0.7 else "%Y/%m/%d %H:%M:%S"
+        times = [t.strftime(fmt) for t in (depart, arrive, back)]
+        if rnd.random() < 0.1:
+            times[rnd.randrange(3)] = ""
+        outbound.append([date, county, unit, name, phone, rnd.choice(["王護理師", "陳醫師", ""]), *times, ""])
+    outbound[1:] = sorted(outbound[1:], key=lambda r: r[0].replace("/", "-"))
+
+    transfer = [TRANSFER_HEADER]
+    for _ in range(transfer_rows):
+        day, date, county, unit, name, phone = base_row(rnd.random() < 0.3)
+        transfer.append([date, county, unit, name, phone, rnd.choice(["林專師", ""]), ""])
+    transfer[1:] = sorted(transfer[1:], key=lambda r: r[0].replace("/", "-"))
+    return {"外接出勤": outbound, "轉出": transfer}
+
+
+def tiny_png(width: int = 64, height: int = 64, shade: int = 0) -> bytes:
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+    raw = b"".join(b"\x00" + bytes((shade, 128, 255 - shade)) * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
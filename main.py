@@ -1,22 +1,317 @@
 import os
 import json
-import requests
-from fastapi import FastAPI, Response
+import sqlite3
+import asyncio
+import httpx
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
-import warnings
 import pytz
 import re
 import time
+import bisect
+import math
+import difflib
+import uuid
+import threading
+from collections import OrderedDict
+from array import array
+import gzip
+import hashlib
+import brotli
+import orjson
+from urllib.parse import quote
 
-from urllib3.exceptions import InsecureRequestWarning
-warnings.simplefilter('ignore', InsecureRequestWarning)
 
-import gspread
-from google.oauth2.service_account import Credentials
+# ─────────────────────────────────────────────
+# 監控指標（Prometheus 文字格式，/metrics）
+# ─────────────────────────────────────────────
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 依網址判斷上游呼叫點，(regex, 名稱)；名稱中的 {0} 代入第一個群組
+UPSTREAM_SITES = [
+    (re.compile(r"/(?:datastore|opendataapi)/([A-Z]-[A-Z0-9]+-\d+)"), "cwa:{0}"),
+    (re.compile(r"/Data/radar/"),                                   "cwa:radar"),
+    (re.compile(r"/map-data/"),                                     "1968:rainfall-map"),
+    (re.compile(r"/auth/realms/TDXConnect/"),                       "tdx:token"),
+    (re.compile(r"/Road/Traffic/Live/News/"),                       "tdx:news"),
+    (re.compile(r"/v2/bot/message/(\w+)"),                          "line:{0}"),
+    (re.compile(r"/api-create\.php"),                               "tinyurl"),
+]
+
+
+def upstream_site(url: str) -> str:
+    for pattern, name in UPSTREAM_SITES:
+        m = pattern.search(url)
+        if m:
+            return name.format(*m.groups())
+    return httpx.URL(url).host or "other"
+
+
+class Metrics:
+    def __init__(self):
+        # gspread 在 worker thread 中記錄，更新時加鎖
+        self._lock = threading.Lock()
+        self.latency: Dict[str, List[float]] = {}   # site → 各 bucket 次數 + [總和, 次數]
+        self.bytes:   Dict[str, int] = {}
+        self.status:  Dict[tuple, int] = {}         # (site, status) → 次數
+        self.last_success: Dict[str, float] = {}
+        self.cache:   Dict[tuple, int] = {}         # (快取名稱, hit/miss/stale) → 次數
+
+    def observe_upstream(self, site: str, status: str, seconds: float, nbytes: int = 0):
+        with self._lock:
+            hist = self.latency.get(site)
+            if hist is None:
+                hist = self.latency[site] = [0] * (len(LATENCY_BUCKETS) + 2)
+            idx = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+            if idx < len(LATENCY_BUCKETS):
+                hist[idx] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+            self.bytes[site] = self.bytes.get(site, 0) + nbytes
+            self.status[(site, status)] = self.status.get((site, status), 0) + 1
+            if status.startswith(("2", "3")) or status == "ok":
+                self.last_success[site] = time.time()
+
+    def count_cache(self, name: str, result: str):
+        self.cache[(name, result)] = self.cache.get((name, result), 0) + 1
+
+    def timed(self, site: str):
+        return _TimedCall(self, site)
+
+    def render(self) -> str:
+        out = [
+            "# HELP upstream_request_duration_seconds Upstream call latency.",
+            "# TYPE upstream_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            for site, hist in sorted(self.latency.items()):
+                cumulative = 0
+                for le, n in zip(LATENCY_BUCKETS, hist):
+                    cumulative += n
+                    out.append(f'upstream_request_duration_seconds_bucket{{site="{site}",le="{le}"}} {cumulative}')
+                out.append(f'upstream_request_duration_seconds_bucket{{site="{site}",le="+Inf"}} {hist[-1]}')
+                out.append(f'upstream_request_duration_seconds_sum{{site="{site}"}} {hist[-2]:.6f}')
+                out.append(f'upstream_request_duration_seconds_count{{site="{site}"}} {hist[-1]}')
+            out += ["# HELP upstream_response_bytes_total Response body bytes received.",
+                    "# TYPE upstream_response_bytes_total counter"]
+            out += [f'upstream_response_bytes_total{{site="{site}"}} {n}' for site, n in sorted(self.bytes.items())]
+            out += ["# HELP upstream_requests_total Upstream calls by status code (error = no response).",
+                    "# TYPE upstream_requests_total counter"]
+            out += [f'upstream_requests_total{{site="{site}",status="{status}"}} {n}'
+                    for (site, status), n in sorted(self.status.items())]
+            out += ["# HELP upstream_last_success_timestamp_seconds Last successful upstream call.",
+                    "# TYPE upstream_last_success_timestamp_seconds gauge"]
+            out += [f'upstream_last_success_timestamp_seconds{{site="{site}"}} {t:.3f}'
+                    for site, t in sorted(self.last_success.items())]
+        out += ["# HELP cache_requests_total Requests served from cached snapshots.",
+                "# TYPE cache_requests_total counter"]
+        out += [f'cache_requests_total{{cache="{name}",result="{result}"}} {n}'
+                for (name, result), n in sorted(self.cache.items())]
+        out += ["# HELP upstream_circuit_open Whether the circuit breaker for the call site is open.",
+                "# TYPE upstream_circuit_open gauge"]
+        out += [f'upstream_circuit_open{{site="{site}"}} {int(b.is_open)}'
+                for site, b in sorted(circuit_breakers.items())]
+        out += ["# HELP feed_last_success_timestamp_seconds Last successful refresh of each feed.",
+                "# TYPE feed_last_success_timestamp_seconds gauge"]
+        out += [f'feed_last_success_timestamp_seconds{{feed="{feed.name}"}} {feed.fetched_at:.3f}'
+                for feed in FEEDS.values()]
+        return "\n".join(out) + "\n"
+
+
+class _TimedCall:
+    # 非 HTTP 的上游呼叫（gspread）：with metrics.timed("sheets:...") 計時
+    def __init__(self, metrics: Metrics, site: str):
+        self.metrics = metrics
+        self.site    = site
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        status = "ok"
+        if exc is not None:
+            code = getattr(getattr(exc, "response", None), "status_code", None)
+            status = str(code) if code else "error"
+        self.metrics.observe_upstream(self.site, status, time.perf_counter() - self.start)
+        return False
+
+
+metrics = Metrics()
+
+
+class _MeteredStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, done):
+        self._stream = stream
+        self._done   = done
+        self.nbytes  = 0
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self.nbytes += len(chunk)
+            yield chunk
+
+    async def aclose(self):
+        await self._stream.aclose()
+        self._done(self.nbytes)
+
+
+class MeteredTransport(httpx.AsyncBaseTransport):
+    # 包住實際的 transport：每個請求記錄延遲（到讀完 body）、位元組數與狀態碼
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        site  = upstream_site(str(request.url))
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except CircuitOpenError:
+            metrics.observe_upstream(site, "circuit-open", time.perf_counter() - start)
+            raise
+        except Exception:
+            metrics.observe_upstream(site, "error", time.perf_counter() - start)
+            raise
+        status = str(response.status_code)
+        response.stream = _MeteredStream(
+            response.stream,
+            lambda nbytes: metrics.observe_upstream(site, status, time.perf_counter() - start, nbytes))
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+# ─────────────────────────────────────────────
+# 斷路器：同一個上游呼叫點連續失敗就暫停呼叫，之後以加倍的間隔放行一個探測請求
+# ─────────────────────────────────────────────
+BREAKER_FAILURES         = int(os.environ.get('BREAKER_FAILURES', '3'))
+BREAKER_OPEN_SECONDS     = float(os.environ.get('BREAKER_OPEN_SECONDS', '30'))
+BREAKER_MAX_OPEN_SECONDS = float(os.environ.get('BREAKER_MAX_OPEN_SECONDS', '600'))
+
+
+class CircuitOpenError(httpx.TransportError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, site: str):
+        self.site       = site
+        self.failures   = 0
+        self.open_until = 0.0    # 0 表示關閉（正常放行）
+        self.backoff    = BREAKER_OPEN_SECONDS
+        self.probing    = False
+
+    @property
+    def is_open(self) -> bool:
+        return bool(self.open_until)
+
+    def allow(self) -> bool:
+        if not self.open_until:
+            return True
+        if self.probing or time.time() < self.open_until:
+            return False
+        # 半開：只放行一個探測請求
+        self.probing = True
+        return True
+
+    def record(self, ok: bool):
+        if ok:
+            if self.open_until:
+                print(f"[breaker] {self.site} 恢復")
+            self.failures, self.open_until, self.backoff, self.probing = 0, 0.0, BREAKER_OPEN_SECONDS, False
+            return
+        self.failures += 1
+        if self.probing:
+            self.backoff    = min(self.backoff * 2, BREAKER_MAX_OPEN_SECONDS)
+            self.open_until = time.time() + self.backoff
+            self.probing    = False
+        elif not self.open_until and self.failures >= BREAKER_FAILURES:
+            self.open_until = time.time() + self.backoff
+            print(f"[breaker] {self.site} 連續失敗 {self.failures} 次，暫停 {self.backoff:.0f} 秒")
+
+    def release(self):
+        # 探測請求被取消，沒有結果
+        self.probing = False
+
+
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+
+class CircuitBreakerTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        site = upstream_site(str(request.url))
+        breaker = circuit_breakers.get(site)
+        if breaker is None:
+            breaker = circuit_breakers[site] = CircuitBreaker(site)
+        if not breaker.allow():
+            raise CircuitOpenError(f"{site} 暫停呼叫中（斷路器開啟）", request=request)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record(False)
+            raise
+        # 4xx（含 CWA 無颱風時的 404）代表服務有回應，不算故障
+        breaker.record(response.status_code < 500 and response.status_code != 429)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+# ─────────────────────────────────────────────
+# 共用 HTTP client（keep-alive 連線池，可用時走 HTTP/2）
+# ─────────────────────────────────────────────
+HTTP_MAX_CONNECTIONS  = int(os.environ.get('HTTP_MAX_CONNECTIONS', '50'))
+HTTP_MAX_KEEPALIVE    = int(os.environ.get('HTTP_MAX_KEEPALIVE', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY', '60'))
+HTTP2_ENABLED         = os.environ.get('HTTP2_ENABLED', '1') != '0'
+
+http_client: Optional[httpx.AsyncClient] = None   # 一般外部服務（TDX、LINE、TinyURL）
+cwa_client:  Optional[httpx.AsyncClient] = None   # CWA 憑證鏈有問題，沿用原本的 verify=False
+
+
+def _new_http_client(verify: bool) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    transport = httpx.AsyncHTTPTransport(http2=HTTP2_ENABLED, limits=limits, verify=verify)
+    return httpx.AsyncClient(transport=MeteredTransport(CircuitBreakerTransport(transport)),
+                             follow_redirects=True, timeout=15)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client, cwa_client
+    http_client = _new_http_client(verify=True)
+    cwa_client  = _new_http_client(verify=False)
+    restore_feed_snapshots()
+    rain_history.load()
+    tasks = start_feed_scheduler() + line_dispatcher.start() + line_webhook_queue.start()
+    try:
+        yield
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        tdx_tokens.close()
+        await http_client.aclose()
+        await cwa_client.aclose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,34 +325,481 @@ TDX_APP_ID     = os.environ.get('TDX_APP_ID',  't1190t-64266cda-41c7-451f')
 TDX_APP_KEY    = os.environ.get('TDX_APP_KEY', '0d5f5de8-ab0b-4d28-a573-92a3406c178c')
 CWA_API_KEY    = os.environ.get('CWA_API_KEY', 'CWA-B3D5458A-4530-4045-A702-27A786C1E934')
 GOOGLE_SA_JSON = os.environ.get('GOOGLE_SERVICE_ACCOUNT_JSON', '')
+
+# 上游服務位址（bench/ 的離線測試改指向本機 stub server）
+CWA_API_BASE        = os.environ.get('CWA_API_BASE',        'https://opendata.cwa.gov.tw')
+CWA_WEB_BASE        = os.environ.get('CWA_WEB_BASE',        'https://www.cwa.gov.tw')
+RAINFALL_MAP_MIRROR = os.environ.get('RAINFALL_MAP_MIRROR', 'https://c1.1968services.tw')
+TDX_API_BASE        = os.environ.get('TDX_API_BASE',        'https://tdx.transportdata.tw')
+LINE_API_BASE       = os.environ.get('LINE_API_BASE',       'https://api.line.me')
+TINYURL_BASE        = os.environ.get('TINYURL_BASE',        'https://tinyurl.com')
 SHEET_ID       = '1oG1ydRWD7eELqB2myuoECuQFTffkCGqirwROLe3SXcE'
+DATA_DIR       = os.environ.get('DATA_DIR', 'data')
+SNAPSHOT_DIR   = os.path.join(DATA_DIR, 'snapshots')
 
 TAIPEI_TZ = pytz.timezone('Asia/Taipei')
 
-cached_road_data     = None
-last_fetch_time      = 0
-CACHE_DURATION_SECONDS = 300
-
-cached_hospital_data = None
-hospital_cache_time  = 0
-HOSPITAL_CACHE_SECONDS = 30 * 60
+# 各資料源的更新週期（秒），對應上游發布頻率
+RAIN_REFRESH_SECONDS       = 10 * 60   # O-A0002-001 每 10 分鐘
+FORECAST_REFRESH_SECONDS   = 30 * 60   # F-C0032-001 每 6 小時發布，半小時檢查一次
+EARTHQUAKE_REFRESH_SECONDS = 60        # E-A0015-001 有感地震隨時發布
+TYPHOON_REFRESH_SECONDS    = 10 * 60   # T-A0001-001 警報期間約每 3 小時
+CACHE_DURATION_SECONDS     = 300       # TDX 路況
+HOSPITAL_CACHE_SECONDS     = 30 * 60   # Google Sheets
+FEED_RETRY_SECONDS         = 60        # 失敗後提早重試
 
 # 轉診眼鏡連結（固定值，作為 fallback）
 DEFAULT_WEBEX_LINK = 'https://ntuhmeeting.webex.com/ntuhmeeting-tc/j.php?MTID=mefb688127166ca0e62fdf919ef00d469'
 
 
+# ─────────────────────────────────────────────
+# Single-flight：同一個 key 同時只會有一個上游請求，其餘呼叫端共用結果
+# ─────────────────────────────────────────────
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Any, asyncio.Task] = {}
+
+    def in_flight(self, key) -> bool:
+        return key in self._calls
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._calls.pop(key, None) if self._calls.get(key) is t else None)
+        # shield：單一呼叫端被取消時不影響其他等待者
+        return await asyncio.shield(task)
+
+    async def join(self, keys, timeout: float):
+        # 等候進行中的呼叫最多 timeout 秒，不會發出新的呼叫
+        tasks = [self._calls[k] for k in keys if k in self._calls]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+    def start(self, key, fn):
+        # 背景觸發（不等待結果）；已在進行中則不重複發出
+        if key not in self._calls:
+            asyncio.ensure_future(self.do(key, fn)).add_done_callback(_log_background_error)
+
+
+def _log_background_error(fut: asyncio.Future):
+    if not fut.cancelled() and fut.exception() is not None:
+        print(f"[background] {fut.exception()}")
+
+
+singleflight = SingleFlight()
+
+
+# ─────────────────────────────────────────────
+# 快取後端：多個 uvicorn worker 共用資料與更新租約
+#   CACHE_BACKEND=local  （預設）單一 process，全部在記憶體
+#   CACHE_BACKEND=sqlite  DATA_DIR/cache.sqlite3（WAL），每個資料源同時只有一個 worker 持有租約去抓上游
+# ─────────────────────────────────────────────
+CACHE_BACKEND       = os.environ.get('CACHE_BACKEND', 'local')
+FEED_LEASE_SECONDS  = int(os.environ.get('FEED_LEASE_SECONDS', '120'))   # 持有者當掉時，其他 worker 最久等這麼久接手
+FEED_FOLLOW_SECONDS = int(os.environ.get('FEED_FOLLOW_SECONDS', '10'))   # 非持有者檢查共用快取的間隔
+WORKER_ID           = f"{os.uname().nodename}:{os.getpid()}"
+
+
+class LocalCacheBackend:
+    # 單一 worker：租約永遠拿得到，共用資料就是本身的記憶體；集合另存成 JSON 檔，重啟後仍在
+    shared = False
+
+    def __init__(self, sets_path: str):
+        self.sets_path = sets_path
+        self._sets: Dict[str, Dict[str, float]] = {}
+        self._claims: "OrderedDict[str, float]" = OrderedDict()
+        try:
+            with open(sets_path, encoding="utf-8") as f:
+                self._sets = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"[cache] 集合檔讀取失敗：{e}")
+
+    def acquire_lease(self, name: str, ttl: float) -> bool:
+        return True
+
+    def claim_once(self, key: str, ttl: float) -> bool:
+        # ttl 內第一次看到 key 才回傳 True（所有 key 的 ttl 相同，過期的都在最前面）
+        now = time.time()
+        while self._claims and next(iter(self._claims.values())) < now:
+            self._claims.popitem(last=False)
+        if key in self._claims:
+            return False
+        self._claims[key] = now + ttl
+        return True
+
+    def put(self, key: str, value: bytes) -> int:
+        return 0
+
+    def get(self, key: str, since: int = 0) -> Optional[tuple]:
+        return None
+
+    def add_member(self, set_name: str, member: str) -> bool:
+        members = self._sets.setdefault(set_name, {})
+        if member in members:
+            return False
+        members[member] = time.time()
+        try:
+            _atomic_write(self.sets_path, json.dumps(self._sets, ensure_ascii=False).encode("utf-8"))
+        except OSError as e:
+            print(f"[cache] 集合檔寫入失敗：{e}")
+        return True
+
+    def members(self, set_name: str) -> List[str]:
+        return list(self._sets.get(set_name, {}))
+
+
+class SqliteCacheBackend:
+    shared = True
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # 只在 event loop 上使用；查詢都是單列主鍵存取，不會卡住
+        self.conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS entries "
+                          "(key TEXT PRIMARY KEY, version INTEGER NOT NULL, value BLOB NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS leases "
+                          "(name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS set_members "
+                          "(set_name TEXT NOT NULL, member TEXT NOT NULL, added_at REAL NOT NULL, "
+                          "PRIMARY KEY (set_name, member))")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+        self._claim_count = 0
+
+    def acquire_lease(self, name: str, ttl: float) -> bool:
+        # 沒人持有、已過期或本來就是自己 → 取得（並延長）租約
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+            (name, WORKER_ID, now + ttl, now))
+        row = self.conn.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()
+        return bool(row) and row[0] == WORKER_ID
+
+    def claim_once(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        self._claim_count += 1
+        if self._claim_count % 100 == 0:
+            self.conn.execute("DELETE FROM claims WHERE expires_at < ?", (now,))
+        cur = self.conn.execute(
+            "INSERT INTO claims (key, expires_at) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at WHERE claims.expires_at < ?",
+            (key, now + ttl, now))
+        return cur.rowcount > 0
+
+    def put(self, key: str, value: bytes) -> int:
+        row = self.conn.execute(
+            "INSERT INTO entries (key, version, value) VALUES (?, 1, ?) "
+            "ON CONFLICT(key) DO UPDATE SET version = entries.version + 1, value = excluded.value "
+            "RETURNING version", (key, value)).fetchone()
+        return row[0]
+
+    def get(self, key: str, since: int = 0) -> Optional[tuple]:
+        # 版本沒變就不讀 value
+        row = self.conn.execute("SELECT version FROM entries WHERE key = ?", (key,)).fetchone()
+        if not row or row[0] == since:
+            return None
+        row = self.conn.execute("SELECT version, value FROM entries WHERE key = ?", (key,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def add_member(self, set_name: str, member: str) -> bool:
+        cur = self.conn.execute("INSERT OR IGNORE INTO set_members (set_name, member, added_at) VALUES (?, ?, ?)",
+                                (set_name, member, time.time()))
+        return cur.rowcount > 0
+
+    def members(self, set_name: str) -> List[str]:
+        rows = self.conn.execute("SELECT member FROM set_members WHERE set_name = ? ORDER BY added_at", (set_name,))
+        return [m for (m,) in rows]
+
+
+def _new_cache_backend():
+    if CACHE_BACKEND == "sqlite":
+        return SqliteCacheBackend(os.path.join(DATA_DIR, "cache.sqlite3"))
+    if CACHE_BACKEND != "local":
+        print(f"[cache] 未知的 CACHE_BACKEND={CACHE_BACKEND}，改用 local")
+    return LocalCacheBackend(os.path.join(DATA_DIR, "cache-sets.json"))
+
+
+cache_backend = _new_cache_backend()
+
+
+# ─────────────────────────────────────────────
+# 資料源快照（背景排程更新，失敗時沿用上次成功的資料）
+# ─────────────────────────────────────────────
+class Feed:
+    def __init__(self, name: str, loader, interval: float):
+        self.name       = name
+        self.loader     = loader
+        self.interval   = interval
+        self.data       = None
+        self.fetched_at = 0.0
+        self.error: Optional[str] = None
+        self.restored   = False   # 資料來自磁碟快照，尚未於本次啟動後更新
+        self.retry_at   = 0.0
+        self.version    = 0       # 共用快取中的版本
+
+    @property
+    def is_due(self) -> bool:
+        if time.time() < self.retry_at:
+            return False
+        return self.restored or not self.fetched_at or self.age >= self.interval
+
+    @property
+    def age(self) -> Optional[float]:
+        return time.time() - self.fetched_at if self.fetched_at else None
+
+    @property
+    def is_stale(self) -> bool:
+        return self.restored or not self.fetched_at or self.age > self.interval * 2
+
+    def status(self) -> Dict[str, Any]:
+        # 只放不隨時間變動的欄位，回應內容在資料更新前維持相同（ETag 才會命中）
+        fetched = (datetime.fromtimestamp(self.fetched_at, TAIPEI_TZ).strftime("%Y-%m-%d %H:%M:%S")
+                   if self.fetched_at else None)
+        return {"fetchedAt": fetched, "stale": self.is_stale, "error": self.error,
+                "available": self.data is not None}
+
+    def cache_key(self) -> tuple:
+        return (self.fetched_at, self.is_stale, self.error)
+
+    def count_read(self):
+        # 請求讀取快照時記錄 hit / stale / miss
+        result = "miss" if self.data is None else "stale" if self.is_stale else "hit"
+        metrics.count_cache(self.name, result)
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(SNAPSHOT_DIR, f"{self.name}.json")
+
+    async def save_snapshot(self):
+        # 在 event loop 上序列化（資料可能之後被就地更新），寫檔交給 thread
+        body = json.dumps({"name": self.name, "fetched_at": self.fetched_at, "data": self.data},
+                          ensure_ascii=False).encode("utf-8")
+        try:
+            await asyncio.to_thread(_atomic_write, self.snapshot_path, body)
+        except OSError as e:
+            print(f"[{self.name}] 快照寫入失敗：{e}")
+
+    def load_snapshot(self) -> bool:
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snap = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"[{self.name}] 快照讀取失敗：{e}")
+            return False
+        self.data       = snap.get("data")
+        self.fetched_at = float(snap.get("fetched_at") or 0)
+        self.restored   = True
+        return True
+
+    async def refresh(self) -> bool:
+        # 排程與請求端同時觸發時只會抓一次
+        return await singleflight.do(("feed", self.name), self._refresh)
+
+    async def _refresh(self) -> bool:
+        if not cache_backend.acquire_lease(f"feed:{self.name}", FEED_LEASE_SECONDS):
+            # 其他 worker 負責抓這個資料源，這裡只讀共用快取
+            self.pull()
+            self.retry_at = time.time() + FEED_FOLLOW_SECONDS
+            return self.data is not None and self.error is None
+        try:
+            data = await self.loader()
+        except Exception as e:
+            self.error    = str(e) or type(e).__name__
+            self.retry_at = time.time() + min(self.interval, FEED_RETRY_SECONDS)
+            print(f"[{self.name}] 更新失敗，沿用上次快照：{self.error}")
+            self.publish()
+            self.notify()
+            return False
+        self.data       = data
+        self.fetched_at = time.time()
+        self.error      = None
+        self.restored   = False
+        self.retry_at   = 0.0
+        self.publish()
+        self.notify()
+        await self.save_snapshot()
+        return True
+
+    def publish(self):
+        if cache_backend.shared:
+            body = orjson.dumps({"data": self.data, "fetched_at": self.fetched_at,
+                                 "restored": self.restored, "error": self.error})
+            self.version = cache_backend.put(f"feed:{self.name}", body)
+
+    def pull(self) -> bool:
+        # 共用快取有較新的版本時採用（其他 worker 更新的結果）
+        entry = cache_backend.get(f"feed:{self.name}", since=self.version)
+        if entry is None:
+            return False
+        self.version = entry[0]
+        snap = orjson.loads(entry[1])
+        self.data       = snap["data"]
+        self.fetched_at = snap["fetched_at"]
+        self.restored   = snap["restored"]
+        self.error      = snap["error"]
+        self.notify()
+        return True
+
+    def notify(self):
+        # listener 出錯不影響其他 listener，也不能中斷 refresh（快照還要寫入）
+        for listener in FEED_LISTENERS:
+            try:
+                listener(self)
+            except Exception as e:
+                print(f"[{self.name}] listener {getattr(listener, '__qualname__', listener)} 失敗：{e!r}")
+
+    async def run(self):
+        while True:
+            try:
+                self.pull()
+                if self.is_due:
+                    await self.refresh()
+            except Exception as e:
+                # 共用快取暫時無法存取（例如 sqlite 被鎖住）等錯誤：記錄後稍後再試，排程不能就此停止
+                print(f"[{self.name}] 排程執行失敗：{e!r}")
+                self.retry_at = time.time() + min(self.interval, FEED_RETRY_SECONDS)
+            delay = (self.retry_at if self.retry_at > time.time() else self.fetched_at + self.interval) - time.time()
+            if cache_backend.shared:
+                delay = min(delay, FEED_FOLLOW_SECONDS)
+            await asyncio.sleep(max(delay, 1))
+
+
+FEEDS: Dict[str, Feed] = {}
+FEED_LISTENERS: List = []   # 資料源狀態改變時呼叫 listener(feed)
+
+
+def register_feed(name: str, loader, interval: float) -> Feed:
+    feed = Feed(name, loader, interval)
+    FEEDS[name] = feed
+    return feed
+
+
+def _atomic_write(path: str, body: bytes):
+    # 先寫暫存檔再 rename，重啟時不會讀到寫一半的快照
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def restore_feed_snapshots():
+    # 啟動時先載入上次的快照立即提供服務（標記為 stale），背景排程隨即更新
+    restored = [feed.name for feed in FEEDS.values() if feed.load_snapshot()]
+    if restored:
+        print(f"[snapshot] 已載入快照：{', '.join(restored)}")
+
+
+def start_feed_scheduler() -> List[asyncio.Task]:
+    return [asyncio.create_task(feed.run(), name=f"feed:{feed.name}") for feed in FEEDS.values()]
+
+
+# ─────────────────────────────────────────────
+# 預先序列化的 JSON 回應：快照不變時重用同一份 bytes、壓縮結果與 ETag
+# ─────────────────────────────────────────────
+COMPRESS_MIN_BYTES = 1024
+
+
+class EncodedPayload:
+    def __init__(self, payload: Any):
+        self.body = orjson.dumps(payload)
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=16).hexdigest() + '"'
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: str) -> bytes:
+        # 壓縮結果在第一次需要時產生並保留
+        if encoding not in self._encoded:
+            if encoding == "br":
+                self._encoded[encoding] = brotli.compress(self.body, quality=5)
+            else:
+                self._encoded[encoding] = gzip.compress(self.body, compresslevel=6)
+        return self._encoded[encoding]
+
+
+def _pick_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        q = params.strip().replace(" ", "")
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                pass
+        accepted.add(name.strip())
+    for encoding in ("br", "gzip"):
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+def encoded_json_response(request: Request, payload: EncodedPayload) -> Response:
+    headers = {"ETag": payload.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    inm = request.headers.get("if-none-match", "")
+    if inm and (inm.strip() == "*" or payload.etag in (t.strip().removeprefix("W/") for t in inm.split(","))):
+        return Response(status_code=304, headers=headers)
+
+    body = payload.body
+    encoding = _pick_encoding(request.headers.get("accept-encoding", "")) if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding:
+        body = payload.encoded(encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+class PayloadCache:
+    # key 不變就沿用上次的 EncodedPayload
+    def __init__(self):
+        self.key = None
+        self.payload: Optional[EncodedPayload] = None
+
+    def get(self, key, build) -> EncodedPayload:
+        if self.payload is None or key != self.key:
+            self.payload = EncodedPayload(build())
+            self.key = key
+        return self.payload
+
+
 # ─────────────────────────────────────────────
 # TinyURL 縮網址（失敗時 fallback 原始網址）
 # ─────────────────────────────────────────────
-def shorten_url(long_url: str) -> str:
+TINYURL_CACHE_SIZE = 256
+short_url_cache: "OrderedDict[str, str]" = OrderedDict()   # LRU：同一個網址只縮一次
+
+
+async def shorten_url(long_url: str) -> str:
+    if long_url in short_url_cache:
+        short_url_cache.move_to_end(long_url)
+        return short_url_cache[long_url]
+    return await singleflight.do(("tinyurl", long_url), lambda: _shorten_url(long_url))
+
+
+async def _shorten_url(long_url: str) -> str:
     try:
-        resp = requests.get(
-            "https://tinyurl.com/api-create.php",
+        resp = await http_client.get(
+            f"{TINYURL_BASE}/api-create.php",
             params={"url": long_url},
             timeout=5,
         )
         if resp.status_code == 200 and resp.text.startswith("https://"):
-            return resp.text.strip()
+            short = resp.text.strip()
+            # 只快取成功的結果，失敗的下次再試
+            short_url_cache[long_url] = short
+            if len(short_url_cache) > TINYURL_CACHE_SIZE:
+                short_url_cache.popitem(last=False)
+            return short
     except Exception as e:
         print(f"[tinyurl] 縮網址失敗，使用原始網址：{e}")
     return long_url
@@ -79,15 +821,18 @@ def get_rain_level(value: float) -> tuple:
 # ─────────────────────────────────────────────
 # 醫院資料（Google Sheets）
 # ─────────────────────────────────────────────
+DT_FORMATS = (
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M",
+    "%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M",
+    "%Y-%m-%d", "%Y/%m/%d",
+)
+
+
 def _parse_dt(val: str) -> Optional[datetime]:
     if not val or not val.strip():
         return None
     val = val.strip()
-    for fmt in (
-        "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M",
-        "%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M",
-        "%Y-%m-%d", "%Y/%m/%d",
-    ):
+    for fmt in DT_FORMATS:
         try:
             return datetime.strptime(val, fmt)
         except ValueError:
@@ -95,61 +840,260 @@ def _parse_dt(val: str) -> Optional[datetime]:
     return None
 
 
-def _format_date(val: str) -> str:
-    dt = _parse_dt(val)
-    if dt:
-        return dt.strftime("%Y-%m-%d")
-    return val.strip()
+# 與 strptime 對應欄位相同的寫法（秒數 60/61、日期前置空白等少見情況交給 _parse_dt）
+_DT_PART = {"%Y": r"(\d\d\d\d)", "%m": r"(1[0-2]|0[1-9]|[1-9])", "%d": r"(3[01]|[12]\d|0[1-9]|[1-9])",
+            "%H": r"(2[0-3]|[01]\d|\d)", "%M": r"([0-5]\d|\d)", "%S": r"([0-5]\d|\d)"}
+DT_FAST_PATTERNS = {
+    fmt: re.compile(re.sub(r"%[YmdHMS]", lambda m: _DT_PART[m.group()], fmt).replace(" ", r"\s+"))
+    for fmt in DT_FORMATS
+}
+DT_SAMPLE_SIZE = 50
+DT_CACHE_MAX   = 200_000
+_dt_cache: Dict[str, Optional[datetime]] = {}   # 原始字串 → 解析結果（跨欄位共用，語意與 _parse_dt 相同）
+
+
+class ColumnDateParser:
+    # 以欄位前幾格推斷主要格式，先用該格式的預先編譯 regex；不符時再試其他格式，最後才交給 _parse_dt
+    def __init__(self, sample: List[str]):
+        counts = {fmt: 0 for fmt in DT_FORMATS}
+        for val in sample[:DT_SAMPLE_SIZE]:
+            val = val.strip()
+            for fmt, pattern in DT_FAST_PATTERNS.items():
+                if pattern.fullmatch(val):
+                    counts[fmt] += 1
+                    break
+        primary = max(DT_FORMATS, key=lambda fmt: counts[fmt])
+        self.format   = primary
+        self.patterns = [DT_FAST_PATTERNS[primary]] + [p for f, p in DT_FAST_PATTERNS.items() if f != primary]
+
+    def parse(self, val: str) -> Optional[datetime]:
+        try:
+            return _dt_cache[val]
+        except KeyError:
+            pass
+        dt = self._parse(val.strip()) if val else None
+        if len(_dt_cache) >= DT_CACHE_MAX:
+            _dt_cache.clear()
+        _dt_cache[val] = dt
+        return dt
+
+    def _parse(self, val: str) -> Optional[datetime]:
+        # 每個字串最多符合一種格式，比對順序不影響結果
+        for pattern in self.patterns:
+            m = pattern.fullmatch(val)
+            if m:
+                try:
+                    return datetime(*(int(g) for g in m.groups()))
+                except ValueError:
+                    return None   # 例如 2 月 30 日，strptime 同樣失敗
+        return _parse_dt(val)
 
+    def format_date(self, val: str) -> str:
+        dt = self.parse(val)
+        if dt:
+            return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}"
+        return val.strip()
 
-@app.get("/api/hospital-data")
-async def get_hospital_data():
-    global cached_hospital_data, hospital_cache_time
 
-    if cached_hospital_data and (time.time() - hospital_cache_time < HOSPITAL_CACHE_SECONDS):
-        return cached_hospital_data
+DT_COLUMNS = ("出勤日期", "出發時間", "抵達他院時間", "回程時間")
 
-    if not GOOGLE_SA_JSON:
-        return {"error": "GOOGLE_SERVICE_ACCOUNT_JSON 未設定", "DB": {}, "TIME_DB": {}, "stats": {}}
 
-    try:
-        creds_dict = json.loads(GOOGLE_SA_JSON)
-        creds = Credentials.from_service_account_info(
-            creds_dict,
-            scopes=["https://www.googleapis.com/auth/spreadsheets.readonly"]
-        )
-        gc = gspread.authorize(creds)
-        sh = gc.open_by_key(SHEET_ID)
-    except Exception as e:
-        print(f"[hospital] Sheets 授權失敗: {e}")
-        return {"error": str(e), "DB": {}, "TIME_DB": {}, "stats": {}}
+def _column_parsers(rows: List[List[str]], get_cell) -> Dict[str, ColumnDateParser]:
+    return {name: ColumnDateParser([get_cell(row, name) for row in rows[:DT_SAMPLE_SIZE]]) for name in DT_COLUMNS}
 
-    outbound_rows = []
-    transfer_rows = []
-    
-    try:
-        ws_out = sh.worksheet("外接出勤")
-        outbound_rows = ws_out.get_all_values()
-    except Exception as e:
-        print(f"[hospital] 外接出勤讀取失敗: {e}")
 
-    try:
-        ws_trans = sh.worksheet("轉出")
-        transfer_rows = ws_trans.get_all_values()
-    except Exception as e:
-        print(f"[hospital] 轉出讀取失敗: {e}")
+# ─────────────────────────────────────────────
+# 醫院資料增量同步：已解析的列存於本機 SQLite，只向 Sheets 讀取新增的列
+# ─────────────────────────────────────────────
+HOSPITAL_DB_PATH           = os.path.join(DATA_DIR, 'hospital.sqlite3')
+HOSPITAL_SHEETS            = [("外接出勤", "轉出院所名稱", "outbound"), ("轉出", "轉回院所名稱", "transfer")]
+SHEET_OVERLAP_ROWS         = 20             # 每次重讀已同步的最後幾列，用來偵測上方是否被修改
+HOSPITAL_FULL_SYNC_SECONDS = 24 * 60 * 60   # 較舊列的修改偵測不到，每天完整同步一次
+
+
+def _trim_row(row: List[str]) -> List[str]:
+    # get_all_values 會補齊欄位，batch_get 不會；一律去掉尾端空白欄以便比對
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+def _trim_rows(rows: List[List[str]]) -> List[List[str]]:
+    rows = [_trim_row(r) for r in rows]
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+class SheetStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._migrated = False
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        # synced_at 為最後一次寫入；full_sync_at 為最後一次完整同步，新增列時不變，重啟後據此判斷是否該完整同步
+        conn.execute("CREATE TABLE IF NOT EXISTS sheet_state "
+                     "(ws TEXT PRIMARY KEY, header TEXT NOT NULL, last_row INTEGER NOT NULL, "
+                     "synced_at REAL NOT NULL, full_sync_at REAL NOT NULL DEFAULT 0)")
+        if not self._migrated:
+            if "full_sync_at" not in {r[1] for r in conn.execute("PRAGMA table_info(sheet_state)")}:
+                try:
+                    # 舊版資料表：補上欄位，下一次同步會先做一次完整同步
+                    conn.execute("ALTER TABLE sheet_state ADD COLUMN full_sync_at REAL NOT NULL DEFAULT 0")
+                except sqlite3.OperationalError:
+                    pass   # 其他 worker 已經補上
+            self._migrated = True
+        conn.execute("CREATE TABLE IF NOT EXISTS sheet_rows "
+                     "(ws TEXT NOT NULL, row_no INTEGER NOT NULL, cells TEXT NOT NULL, "
+                     "PRIMARY KEY (ws, row_no))")
+        return conn
+
+    def state(self, ws: str) -> Optional[tuple]:
+        # 回傳 (標題列, 最後列號, 完整同步時間)
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT header, last_row, full_sync_at FROM sheet_state WHERE ws = ?",
+                               (ws,)).fetchone()
+        finally:
+            conn.close()
+        return (json.loads(row[0]), row[1], row[2]) if row else None
+
+    def rows(self, ws: str, first: int = 2, last: Optional[int] = None) -> List[List[str]]:
+        # first/last 為試算表的列號（第 1 列為標題）
+        query = "SELECT cells FROM sheet_rows WHERE ws = ? AND row_no >= ?"
+        params: list = [ws, first]
+        if last is not None:
+            query += " AND row_no <= ?"
+            params.append(last)
+        conn = self._connect()
+        try:
+            return [json.loads(c) for (c,) in conn.execute(query + " ORDER BY row_no", params)]
+        finally:
+            conn.close()
+
+    def replace(self, ws: str, header: List[str], rows: List[List[str]]):
+        self._write(ws, header, 2, rows, replace=True)
 
-    DB: Dict[str, Any] = {}
-    time_records: Dict[str, list] = {}
-    outbound_count = 0
-    transfer_count = 0
+    def append(self, ws: str, header: List[str], first: int, rows: List[List[str]]):
+        self._write(ws, header, first, rows, replace=False)
 
-    def process_data(rows, hosp_col_name, mission_type):
-        nonlocal outbound_count, transfer_count
-        if len(rows) < 2:
+    def _write(self, ws: str, header: List[str], first: int, rows: List[List[str]], replace: bool):
+        conn = self._connect()
+        try:
+            with conn:
+                if replace:
+                    conn.execute("DELETE FROM sheet_rows WHERE ws = ?", (ws,))
+                conn.executemany("INSERT OR REPLACE INTO sheet_rows (ws, row_no, cells) VALUES (?, ?, ?)",
+                                 [(ws, first + i, json.dumps(r, ensure_ascii=False)) for i, r in enumerate(rows)])
+                now = time.time()
+                conn.execute("INSERT INTO sheet_state (ws, header, last_row, synced_at, full_sync_at) "
+                             "VALUES (?, ?, ?, ?, ?) ON CONFLICT (ws) DO UPDATE SET header = excluded.header, "
+                             "last_row = excluded.last_row, synced_at = excluded.synced_at"
+                             + (", full_sync_at = excluded.full_sync_at" if replace else ""),
+                             (ws, json.dumps(header, ensure_ascii=False), first + len(rows) - 1, now,
+                              now if replace else 0.0))
+        finally:
+            conn.close()
+
+
+sheet_store = SheetStore(HOSPITAL_DB_PATH)
+
+
+_sheet_lock = threading.Lock()
+_hospital_sheet = None
+
+
+def _open_hospital_sheet():
+    # gspread / google-auth 在第一次同步時才載入（只服務儀表板與 LINE 的 process 不必付這個成本）；
+    # 授權過的 client 與試算表在 process 內重用，token 由 google-auth 到期前自動換發
+    global _hospital_sheet
+    with _sheet_lock:
+        if _hospital_sheet is None:
+            import gspread
+            from google.oauth2.service_account import Credentials
+            creds = Credentials.from_service_account_info(
+                json.loads(GOOGLE_SA_JSON),
+                scopes=["https://www.googleapis.com/auth/spreadsheets.readonly"]
+            )
+            gc = gspread.authorize(creds)
+            with metrics.timed("sheets:open"):
+                _hospital_sheet = gc.open_by_key(SHEET_ID)
+        return _hospital_sheet
+
+
+def _sync_worksheet(sh, title: str):
+    with metrics.timed("sheets:worksheet"):
+        ws = sh.worksheet(title)
+    state = sheet_store.state(title)
+    if state and time.time() - state[2] <= HOSPITAL_FULL_SYNC_SECONDS:
+        header, last_row, _ = state
+        first = max(2, last_row - SHEET_OVERLAP_ROWS + 1)
+        with metrics.timed("sheets:batch_get"):
+            head_vals, tail_vals = ws.batch_get(["1:1", f"{first}:{max(ws.row_count, first)}"])
+        tail     = [_trim_row(r) for r in tail_vals]
+        expected = sheet_store.rows(title, first, last_row)
+        if _trim_row(head_vals[0] if head_vals else []) == header and tail[:len(expected)] == expected:
+            new_rows = _trim_rows(tail[len(expected):])
+            if new_rows:
+                sheet_store.append(title, header, last_row + 1, new_rows)
+                print(f"[hospital] {title} 新增 {len(new_rows)} 列")
             return
-        headers = rows[0]
+        print(f"[hospital] {title} 已同步的列有變動，改為完整同步")
+
+    with metrics.timed("sheets:get_all_values"):
+        values = ws.get_all_values()
+    header = _trim_row(values[0]) if values else []
+    sheet_store.replace(title, header, _trim_rows(values[1:]))
+
+
+def _sync_hospital_sheets(synced: Optional[Dict[str, tuple]]) -> tuple:
+    # gspread 為同步 I/O，於 worker thread 中執行以免卡住 event loop
+    # synced 為目前彙總已涵蓋的 {工作表: (完整同步時間, 最後列號)}，None 表示還沒有彙總。
+    # 多個 worker 共用 sheet_store，租約輪替期間其他 worker 同步的列也要補上，因此一律與 store 的狀態比對，
+    # 不能只看這次自己新增的列；store 做過完整同步（其他 worker 也算）則重建。
+    # 回傳 (是否重建, {工作表: (標題列, 列)}, 新的 synced)：重建時為全部列，否則只有彙總還沒有的列
+    sh = _open_hospital_sheet()
+    for title, _, _ in HOSPITAL_SHEETS:
+        try:
+            _sync_worksheet(sh, title)
+        except Exception as e:
+            print(f"[hospital] {title}讀取失敗: {e}")
+
+    states = {title: sheet_store.state(title) for title, _, _ in HOSPITAL_SHEETS}
+    marks  = {title: (state[2], state[1]) if state else (0.0, 1) for title, state in states.items()}
+    rebuild = synced is None or any(
+        title not in synced or synced[title][0] != full_at or synced[title][1] > last_row
+        for title, (full_at, last_row) in marks.items())
+    sheets = {}
+    for title, state in states.items():
+        if state is None:
+            sheets[title] = ([], [])
+        else:
+            first = 2 if rebuild else synced[title][1] + 1
+            sheets[title] = (state[0], sheet_store.rows(title, first, state[1]))
+    return rebuild, sheets, marks
+
+
+class HospitalAggregate:
+    # 醫院統計的增量彙總：新增的列只更新受影響的醫院
+    def __init__(self):
+        self.DB: Dict[str, Any] = {}
+        self.TIME_DB: Dict[str, Any] = {}
+        self.time_records: Dict[str, list] = {}
+        self.outbound_count = 0
+        self.transfer_count = 0
+        self.years: set = set()
+        self.last_date = ""
+        self._dirty: set = set()
+        self._transfer_county: set = set()
+        self.synced: Dict[str, tuple] = {}   # 工作表 → (完整同步時間, 已加入的最後列號)，由 load_hospital_data 維護
+
+    def add_rows(self, headers: List[str], rows: List[List[str]], hosp_col_name: str, mission_type: str):
         col = {h.strip(): i for i, h in enumerate(headers)}
+        DB, time_records = self.DB, self.time_records
 
         def get_cell(row, name):
             idx = col.get(name)
@@ -157,17 +1101,18 @@ async def get_hospital_data():
                 return ""
             return row[idx].strip()
 
-        for row in rows[1:]:
+        parsers = _column_parsers(rows, get_cell)
+        for row in rows:
             name = get_cell(row, hosp_col_name)
             if not name:
                 continue
 
             if mission_type == "outbound":
-                outbound_count += 1
+                self.outbound_count += 1
             else:
-                transfer_count += 1
+                self.transfer_count += 1
 
-            date_fmt = _format_date(get_cell(row, "出勤日期"))
+            date_fmt = parsers["出勤日期"].format_date(get_cell(row, "出勤日期"))
             county   = get_cell(row, "出勤縣市")
             unit     = get_cell(row, "轉出單位")
             phone    = get_cell(row, "轉出醫院之電話") or get_cell(row, "轉回醫院之電話") or ""
@@ -177,18 +1122,26 @@ async def get_hospital_data():
                 DB[name] = {"count": 0, "county": county, "records": []}
 
             DB[name]["count"] += 1
-            if county:
+            # 完整重建時轉出表在後處理，縣市以轉出表為準；增量新增的外接列不可覆蓋
+            if county and (mission_type != "outbound" or name not in self._transfer_county):
                 DB[name]["county"] = county
+                if mission_type != "outbound":
+                    self._transfer_county.add(name)
             DB[name]["records"].append({
                 "date": date_fmt, "phone": phone,
                 "contact": contact, "unit": unit, "county": county,
                 "type": mission_type
             })
+            self._dirty.add(name)
+            if "2019" <= date_fmt[:4] <= "2030":
+                self.years.add(date_fmt[:4])
+            if len(date_fmt) >= 10 and date_fmt > self.last_date:
+                self.last_date = date_fmt
 
             if mission_type == "outbound":
-                t_depart = _parse_dt(get_cell(row, "出發時間"))
-                t_arrive = _parse_dt(get_cell(row, "抵達他院時間"))
-                t_return = _parse_dt(get_cell(row, "回程時間"))
+                t_depart = parsers["出發時間"].parse(get_cell(row, "出發時間"))
+                t_arrive = parsers["抵達他院時間"].parse(get_cell(row, "抵達他院時間"))
+                t_return = parsers["回程時間"].parse(get_cell(row, "回程時間"))
 
                 if t_depart and t_arrive and t_return:
                     go_mins   = (t_arrive - t_depart).total_seconds() / 60
@@ -198,74 +1151,486 @@ async def get_hospital_data():
                             time_records[name] = []
                         time_records[name].append({"go": go_mins, "stay": stay_mins, "date": date_fmt})
 
-    process_data(outbound_rows, "轉出院所名稱", "outbound")
-    process_data(transfer_rows, "轉回院所名稱", "transfer")
-
-    for name in DB:
-        DB[name]["records"].sort(key=lambda r: r["date"], reverse=True)
-
-    TIME_DB: Dict[str, Any] = {}
-    for name, entries in time_records.items():
-        if not entries: continue
-        go_list   = [e["go"]   for e in entries]
-        stay_list = [e["stay"] for e in entries]
-        max_entry = max(entries, key=lambda e: e["stay"])
-        TIME_DB[name] = {
-            "avg_go":        round(sum(go_list)   / len(go_list)),
-            "avg_stay":      round(sum(stay_list) / len(stay_list)),
-            "max_stay":      round(max_entry["stay"]),
-            "max_stay_date": max_entry["date"],
+    def result(self) -> Dict[str, Any]:
+        for name in self._dirty:
+            # 同日期時外接在前，與完整重建的順序一致
+            self.DB[name]["records"].sort(key=lambda r: (r["date"], r["type"] == "outbound"), reverse=True)
+            entries = self.time_records.get(name)
+            if not entries: continue
+            go_list   = [e["go"]   for e in entries]
+            stay_list = [e["stay"] for e in entries]
+            max_entry = max(entries, key=lambda e: e["stay"])
+            self.TIME_DB[name] = {
+                "avg_go":        round(sum(go_list)   / len(go_list)),
+                "avg_stay":      round(sum(stay_list) / len(stay_list)),
+                "max_stay":      round(max_entry["stay"]),
+                "max_stay_date": max_entry["date"],
+            }
+        self._dirty.clear()
+
+        counties = {v["county"] for v in self.DB.values() if v["county"]}
+        return {
+            "DB": self.DB,
+            "TIME_DB": self.TIME_DB,
+            "stats": {
+                "total_missions":    self.outbound_count + self.transfer_count,
+                "outbound_missions": self.outbound_count,
+                "transfer_missions": self.transfer_count,
+                "total_hospitals":   len(self.DB),
+                "total_counties":    len(counties),
+                "years_span":        max(1, len(self.years)),
+                "last_date":         self.last_date,
+            },
         }
 
-    total_missions  = outbound_count + transfer_count
-    total_hospitals = len(DB)
-    counties        = {v["county"] for v in DB.values() if v["county"]}
-
-    valid_years = {r["date"][:4] for v in DB.values() for r in v["records"] if "2019" <= r["date"][:4] <= "2030"}
-    years_span = max(1, len(valid_years))
-
-    all_dates = [r["date"] for v in DB.values() for r in v["records"] if r.get("date") and len(r["date"]) >= 10]
-    last_date = max(all_dates) if all_dates else ""
-
-    result = {
-        "DB": DB,
-        "TIME_DB": TIME_DB,
-        "stats": {
-            "total_missions":    total_missions,
-            "outbound_missions": outbound_count,
-            "transfer_missions": transfer_count,
-            "total_hospitals":   total_hospitals,
-            "total_counties":    len(counties),
-            "years_span":        years_span,
-            "last_date":         last_date,
-        },
-    }
 
-    cached_hospital_data = result
-    hospital_cache_time  = time.time()
-    print(f"[hospital] ✅ 快取已更新：總共 {total_missions} 筆 (外接 {outbound_count}, 轉出 {transfer_count})，{total_hospitals} 家")
+hospital_aggregate: Optional[HospitalAggregate] = None
+
+
+async def load_hospital_data() -> Dict[str, Any]:
+    global hospital_aggregate
+    synced = hospital_aggregate.synced if hospital_aggregate is not None else None
+    rebuild, sheets, marks = await asyncio.to_thread(_sync_hospital_sheets, synced)
+
+    # 彙總在 event loop 上進行，避免與回應序列化同時修改同一份資料
+    if rebuild:
+        hospital_aggregate = HospitalAggregate()
+    added = 0
+    for title, hosp_col_name, mission_type in HOSPITAL_SHEETS:
+        header, rows = sheets[title]
+        hospital_aggregate.add_rows(header, rows, hosp_col_name, mission_type)
+        added += len(rows)
+    hospital_aggregate.synced = marks
+    result = hospital_aggregate.result()
+
+    stats = result["stats"]
+    if rebuild or added:
+        print(f"[hospital] ✅ 快取已更新：總共 {stats['total_missions']} 筆 (外接 {stats['outbound_missions']}, "
+              f"轉出 {stats['transfer_missions']})，{stats['total_hospitals']} 家")
     return result
 
 
+async def _hospital_snapshot() -> tuple:
+    # 回傳 (資料, 錯誤訊息)
+    if not GOOGLE_SA_JSON:
+        return None, "GOOGLE_SERVICE_ACCOUNT_JSON 未設定"
+    feed = FEEDS["hospital"]
+    feed.count_read()
+    if feed.data is None:
+        # 排程尚未完成第一次同步時，由這次請求直接抓取
+        await feed.refresh()
+    if feed.data is None:
+        return None, feed.error or "醫院資料尚未就緒"
+    return feed.data, None
+
+
+hospital_payload = PayloadCache()
+
+
+@app.get("/api/hospital-data")
+async def get_hospital_data(request: Request):
+    data, error = await _hospital_snapshot()
+    if data is None:
+        return {"error": error, "DB": {}, "TIME_DB": {}, "stats": {}}
+    # 以資料源的更新時間 / 錯誤為 key（與儀表板相同）；id(data) 在舊快照釋放後可能被新物件重用
+    return encoded_json_response(request, hospital_payload.get(FEEDS["hospital"].cache_key(), lambda: data))
+
+
+# ─────────────────────────────────────────────
+# 醫院查詢 API（由快照建立的索引回應，不必整包下載 DB）
+# ─────────────────────────────────────────────
+HOSPITAL_PAGE_SIZE_MAX = 100
+
+
+class HospitalIndex:
+    def __init__(self, data: Dict[str, Any]):
+        self.data    = data
+        db           = data.get("DB", {})
+        self.summary = sorted(
+            ({"name": name, "county": v.get("county", ""), "count": v.get("count", 0)} for name, v in db.items()),
+            key=lambda h: (-h["count"], h["name"]))
+        self.by_name   = {h["name"]: h for h in self.summary}
+        self.names     = sorted(db)
+        self.by_county: Dict[str, List[Dict[str, Any]]] = {}
+        for h in self.summary:
+            self.by_county.setdefault(h["county"], []).append(h)
+
+    def search(self, q: str, limit: int) -> List[Dict[str, Any]]:
+        # 依序：名稱前綴 → 名稱包含 → 模糊比對
+        matched: Dict[str, None] = {}
+        i = bisect.bisect_left(self.names, q)
+        while i < len(self.names) and self.names[i].startswith(q) and len(matched) < limit:
+            matched[self.names[i]] = None
+            i += 1
+        if len(matched) < limit:
+            for h in self.summary:
+                if q in h["name"]:
+                    matched.setdefault(h["name"])
+                    if len(matched) >= limit:
+                        break
+        if len(matched) < limit:
+            for name in difflib.get_close_matches(q, self.names, n=limit, cutoff=0.4):
+                matched.setdefault(name)
+                if len(matched) >= limit:
+                    break
+        return [self.by_name[name] for name in matched]
+
+
+_hospital_index: Optional[HospitalIndex] = None
+
+
+def _get_hospital_index(data: Dict[str, Any]) -> HospitalIndex:
+    # 快照換新時才重建索引
+    global _hospital_index
+    if _hospital_index is None or _hospital_index.data is not data:
+        _hospital_index = HospitalIndex(data)
+    return _hospital_index
+
+
+@app.get("/api/hospital-data/stats")
+async def get_hospital_stats():
+    data, error = await _hospital_snapshot()
+    if data is None:
+        return {"error": error, "stats": {}}
+    return {"stats": data["stats"]}
+
+
+@app.get("/api/hospitals")
+async def list_hospitals(county: Optional[str] = None):
+    data, error = await _hospital_snapshot()
+    if data is None:
+        return {"error": error, "hospitals": []}
+    index = _get_hospital_index(data)
+    return {"hospitals": index.by_county.get(county, []) if county else index.summary}
+
+
+@app.get("/api/hospitals/search")
+async def search_hospitals(q: str, limit: int = 10):
+    data, error = await _hospital_snapshot()
+    if data is None:
+        return {"error": error, "hospitals": []}
+    q = q.strip()
+    if not q:
+        return {"hospitals": []}
+    return {"hospitals": _get_hospital_index(data).search(q, max(1, min(limit, 50)))}
+
+
+@app.get("/api/hospitals/{name}")
+async def get_hospital_detail(name: str, page: int = 1, page_size: int = 20):
+    data, error = await _hospital_snapshot()
+    if data is None:
+        return {"error": error}
+    hospital = data["DB"].get(name)
+    if hospital is None:
+        return JSONResponse({"error": f"找不到醫院：{name}"}, status_code=404)
+
+    page      = max(1, page)
+    page_size = max(1, min(page_size, HOSPITAL_PAGE_SIZE_MAX))
+    records   = hospital["records"]
+    start     = (page - 1) * page_size
+    return {
+        "name":      name,
+        "county":    hospital["county"],
+        "count":     hospital["count"],
+        "time":      data["TIME_DB"].get(name),
+        "records":   records[start:start + page_size],
+        "page":      page,
+        "page_size": page_size,
+        "total":     len(records),
+    }
+
+
+# ─────────────────────────────────────────────
+# 外接任務車程分析：車程 / 停留時間以欄位陣列保存，依條件篩選後向量化計算百分位數
+# ─────────────────────────────────────────────
+ANALYTICS_GROUPS      = ("hospital", "county", "year", "month", "hour")
+ANALYTICS_PERCENTILES = (50, 90, 99)
+
+
+class MissionAnalytics:
+    def __init__(self, data: Dict[str, Any], header: List[str], rows: List[List[str]]):
+        import numpy as np   # 只有查詢分析時才載入
+        self.data = data
+        col = {h.strip(): i for i, h in enumerate(header)}
+
+        def get_cell(row, name):
+            idx = col.get(name)
+            if idx is None or idx >= len(row):
+                return ""
+            return row[idx].strip()
+
+        db = data.get("DB", {})
+        self.hospitals: List[str] = []
+        self.counties:  List[str] = []
+        hospital_codes: Dict[str, int] = {}
+        county_codes:   Dict[str, int] = {}
+        hosp, county, year, month, hour, go, stay = [], [], [], [], [], [], []
+        hosp_col = HOSPITAL_SHEETS[0][1]
+        parsers  = _column_parsers(rows, get_cell)
+        for row in rows:
+            name = get_cell(row, hosp_col)
+            if not name:
+                continue
+            t_depart = parsers["出發時間"].parse(get_cell(row, "出發時間"))
+            t_arrive = parsers["抵達他院時間"].parse(get_cell(row, "抵達他院時間"))
+            t_return = parsers["回程時間"].parse(get_cell(row, "回程時間"))
+            if not (t_depart and t_arrive and t_return):
+                continue
+            go_mins   = (t_arrive - t_depart).total_seconds() / 60
+            stay_mins = (t_return - t_arrive).total_seconds() / 60
+            # 與 TIME_DB 相同的有效範圍
+            if not (0 < go_mins < 600 and 0 < stay_mins < 600):
+                continue
+            cty = get_cell(row, "出勤縣市") or db.get(name, {}).get("county", "")
+            if name not in hospital_codes:
+                hospital_codes[name] = len(self.hospitals)
+                self.hospitals.append(name)
+            if cty not in county_codes:
+                county_codes[cty] = len(self.counties)
+                self.counties.append(cty)
+            hosp.append(hospital_codes[name])
+            county.append(county_codes[cty])
+            year.append(t_depart.year)
+            month.append(t_depart.month)
+            hour.append(t_depart.hour)
+            go.append(go_mins)
+            stay.append(stay_mins)
+
+        self.hospital_codes = hospital_codes
+        self.county_codes   = county_codes
+        self.columns = {
+            "hospital": np.array(hosp,   dtype=np.int32),
+            "county":   np.array(county, dtype=np.int16),
+            "year":     np.array(year,   dtype=np.int16),
+            "month":    np.array(month,  dtype=np.int8),
+            "hour":     np.array(hour,   dtype=np.int8),
+        }
+        self.go   = np.array(go,   dtype=np.float64)
+        self.stay = np.array(stay, dtype=np.float64)
+
+    def _summary(self, go, stay) -> Dict[str, Any]:
+        import numpy as np
+        if not len(go):
+            return {"count": 0, "go": None, "stay": None}
+
+        def stats(values):
+            p = np.percentile(values, ANALYTICS_PERCENTILES)
+            return {**{f"p{q}": round(float(v), 1) for q, v in zip(ANALYTICS_PERCENTILES, p)},
+                    "avg": round(float(values.mean()), 1), "max": round(float(values.max()), 1)}
+        return {"count": int(len(go)), "go": stats(go), "stay": stats(stay)}
+
+    def _label(self, group_by: str, code: int):
+        if group_by == "hospital":
+            return self.hospitals[code]
+        if group_by == "county":
+            return self.counties[code]
+        return int(code)
+
+    def query(self, filters: Dict[str, Any], group_by: Optional[str] = None) -> Dict[str, Any]:
+        import numpy as np
+        mask = np.ones(len(self.go), dtype=bool)
+        for name, value in filters.items():
+            if value is None:
+                continue
+            if name == "hospital":
+                value = self.hospital_codes.get(value, -1)
+            elif name == "county":
+                value = self.county_codes.get(value, -1)
+            mask &= self.columns[name] == value
+        go, stay = self.go[mask], self.stay[mask]
+        result = {"filters": {k: v for k, v in filters.items() if v is not None}, **self._summary(go, stay)}
+
+        if group_by:
+            keys  = self.columns[group_by][mask]
+            order = np.argsort(keys, kind="stable")
+            keys, go, stay = keys[order], go[order], stay[order]
+            codes, starts = np.unique(keys, return_index=True)
+            bounds = list(starts[1:]) + [len(keys)]
+            groups = [{group_by: self._label(group_by, int(code)), **self._summary(go[lo:hi], stay[lo:hi])}
+                      for code, lo, hi in zip(codes, starts, bounds)]
+            if group_by == "hospital":
+                groups.sort(key=lambda g: -g["count"])
+            result["groups"] = groups
+        return result
+
+
+_mission_analytics: Optional[MissionAnalytics] = None
+
+
+def _build_mission_analytics(data: Dict[str, Any]) -> MissionAnalytics:
+    # 由本機已同步的試算表列建立（快照還原或多 worker 時也有資料）
+    title = HOSPITAL_SHEETS[0][0]
+    state = sheet_store.state(title)
+    header = state[0] if state else []
+    return MissionAnalytics(data, header, sheet_store.rows(title))
+
+
+async def _get_mission_analytics(data: Dict[str, Any]) -> MissionAnalytics:
+    # 快照換新時才重建
+    global _mission_analytics
+    if _mission_analytics is None or _mission_analytics.data is not data:
+        _mission_analytics = await singleflight.do(
+            ("mission-analytics", id(data)), lambda: asyncio.to_thread(_build_mission_analytics, data))
+    return _mission_analytics
+
+
+@app.get("/api/hospital-analytics")
+async def get_hospital_analytics(hospital: Optional[str] = None, county: Optional[str] = None,
+                                 year: Optional[int] = None, month: Optional[int] = None,
+                                 hour: Optional[int] = None, group_by: Optional[str] = None):
+    if group_by and group_by not in ANALYTICS_GROUPS:
+        return JSONResponse({"error": f"group_by 須為 {', '.join(ANALYTICS_GROUPS)} 之一"}, status_code=400)
+    data, error = await _hospital_snapshot()
+    if data is None:
+        return {"error": error}
+    analytics = await _get_mission_analytics(data)
+    filters = {"hospital": hospital, "county": county, "year": year, "month": month, "hour": hour}
+    return analytics.query(filters, group_by)
+
+
 # ─────────────────────────────────────────────
 # 主儀表板 API
 # ─────────────────────────────────────────────
-@app.get("/api/dashboard-data")
-async def get_dashboard_data() -> Dict[str, Any]:
-    current_time    = datetime.now(TAIPEI_TZ).strftime("%Y-%m-%d %H:%M:%S")
-    rain_info       = await get_cwa_rain_data()
-    earthquake_info = await get_cwa_earthquake_data()
-    typhoon_info    = await get_cwa_typhoon_data()
-    road_info       = await get_suhua_road_data()
+DASHBOARD_FEEDS = ("rain", "rain-forecast", "earthquake", "typhoon", "road")
+DASHBOARD_BUDGET_SECONDS = float(os.environ.get('DASHBOARD_BUDGET_SECONDS', '2'))
+dashboard_payload = PayloadCache()
+
+
+def build_dashboard_last_update() -> str:
+    # lastUpdate 為各資料源中最新一次成功更新的時間
+    newest = max(FEEDS[name].fetched_at for name in DASHBOARD_FEEDS)
+    last_update = datetime.fromtimestamp(newest, TAIPEI_TZ) if newest else datetime.now(TAIPEI_TZ)
+    return last_update.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def build_dashboard_data() -> Dict[str, Any]:
     return {
-        "lastUpdate":     current_time,
-        "rainInfo":       rain_info,
-        "earthquakeInfo": earthquake_info,
-        "roadInfo":       road_info,
-        "typhoonInfo":    typhoon_info,
+        "lastUpdate": build_dashboard_last_update(),
+        **{section: build() for section, (_, build) in DASHBOARD_SECTIONS.items()},
+        "feedStatus": {name: feed.status() for name, feed in FEEDS.items()},
     }
 
 
+def _road_section():
+    road = FEEDS["road"]
+    return road.data if road.data is not None else road_error_sections(road.error)
+
+
+# 區塊名稱 → (依賴的資料源, 產生函式)
+DASHBOARD_SECTIONS = {
+    "rainInfo":       (("rain", "rain-forecast"), lambda: compose_rain_info(FEEDS["rain"].data, FEEDS["rain-forecast"].data)),
+    "earthquakeInfo": (("earthquake",),           lambda: FEEDS["earthquake"].data or []),
+    "roadInfo":       (("road",),                 _road_section),
+    "typhoonInfo":    (("typhoon",),              lambda: FEEDS["typhoon"].data),
+}
+
+
+@app.get("/api/dashboard-data")
+async def get_dashboard_data(request: Request):
+    # 一律由記憶體中的快照回應，上游更新交給背景排程；資料未變時重用已序列化的結果。
+    # 還沒有任何快照（冷啟動）的資料源最多等 DASHBOARD_BUDGET_SECONDS，逾時則以佔位資料回應（available=false）
+    cold = [("feed", name) for name in DASHBOARD_FEEDS if FEEDS[name].data is None]
+    if cold:
+        await singleflight.join(cold, DASHBOARD_BUDGET_SECONDS)
+    for name in DASHBOARD_FEEDS:
+        FEEDS[name].count_read()
+    key = tuple(feed.cache_key() for feed in FEEDS.values())
+    return encoded_json_response(request, dashboard_payload.get(key, build_dashboard_data))
+
+
+# ─────────────────────────────────────────────
+# 即時推播（SSE）：資料源更新後只推送內容有變的區塊
+# ─────────────────────────────────────────────
+SSE_MAX_CLIENTS        = int(os.environ.get('SSE_MAX_CLIENTS', '1000'))
+SSE_QUEUE_SIZE         = 16    # 每條連線最多累積的訊息數，超過就丟掉舊訊息改送完整狀態
+SSE_KEEPALIVE_SECONDS  = 20    # 閒置時送註解行，避免代理伺服器切斷連線
+
+
+class _StreamClient:
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+
+
+class DashboardStream:
+    def __init__(self):
+        self.clients: set = set()
+        self.bodies:   Dict[str, bytes] = {}   # 各區塊最後一次的內容（比對是否改變）
+        self.messages: Dict[str, bytes] = {}   # 各區塊最後一次的 SSE 訊息（新連線先收到完整狀態）
+        self.seq = 0
+
+    def on_feed_change(self, feed: Feed):
+        sections = [name for name, (deps, _) in DASHBOARD_SECTIONS.items() if feed.name in deps]
+        for msg in self._update(sections):
+            for client in list(self.clients):
+                self._send(client, msg)
+
+    def _update(self, sections) -> List[bytes]:
+        # 重新產生指定區塊，回傳內容有變的訊息
+        changed = []
+        last_update = None
+        for name in sections:
+            value = DASHBOARD_SECTIONS[name][1]()
+            body = orjson.dumps(value)
+            if self.bodies.get(name) == body:
+                continue
+            if last_update is None:
+                last_update = build_dashboard_last_update()
+            self.seq += 1
+            self.bodies[name] = body
+            self.messages[name] = (f"id: {self.seq}\nevent: {name}\ndata: ".encode()
+                                   + orjson.dumps({"lastUpdate": last_update, "data": value}) + b"\n\n")
+            changed.append(self.messages[name])
+        return changed
+
+    def _send(self, client: _StreamClient, msg: bytes):
+        try:
+            client.queue.put_nowait(msg)
+        except asyncio.QueueFull:
+            # 連線太慢：清掉累積的差異，改送目前完整狀態
+            while not client.queue.empty():
+                client.queue.get_nowait()
+            for full in self.messages.values():
+                client.queue.put_nowait(full)
+
+    def subscribe(self) -> _StreamClient:
+        missing = [name for name in DASHBOARD_SECTIONS if name not in self.messages]
+        if missing:
+            self._update(missing)
+        client = _StreamClient()
+        for msg in self.messages.values():
+            client.queue.put_nowait(msg)
+        self.clients.add(client)
+        return client
+
+    def unsubscribe(self, client: _StreamClient):
+        self.clients.discard(client)
+
+    async def events(self, client: _StreamClient):
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                try:
+                    msg = await asyncio.wait_for(client.queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    msg = b": keepalive\n\n"
+                yield msg
+        finally:
+            self.unsubscribe(client)
+
+
+dashboard_stream = DashboardStream()
+FEED_LISTENERS.append(dashboard_stream.on_feed_change)
+
+
+@app.get("/api/stream")
+async def stream_dashboard():
+    if len(dashboard_stream.clients) >= SSE_MAX_CLIENTS:
+        return Response(status_code=503, headers={"Retry-After": "30"})
+    client = dashboard_stream.subscribe()
+    return StreamingResponse(dashboard_stream.events(client), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 # ─────────────────────────────────────────────
 # 圖片代理
 # ─────────────────────────────────────────────
@@ -274,315 +1639,924 @@ BROWSER_HEADERS = {
     "Referer":    "https://www.cwa.gov.tw/",
 }
 
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', str(5 * 1024 * 1024)))   # 單張圖片上限
+
+
+class CachedImage:
+    # 共用的圖片快取：依發布週期向上游做條件式請求（If-None-Match / If-Modified-Since），
+    # 失敗時繼續提供最後一張成功的圖
+    def __init__(self, name: str, sources: List[tuple], interval: float):
+        self.name       = name
+        self.sources    = sources          # [(url, headers, timeout)]，依序嘗試
+        self.interval   = interval
+        self.body: Optional[bytes] = None
+        self.media_type = "image/png"
+        self.etag       = ""
+        self.source_url = ""
+        self.validators: Dict[str, str] = {}   # 上游回傳的 ETag / Last-Modified
+        self.checked_at = 0.0
+        self.version    = 0
+
+    @property
+    def is_due(self) -> bool:
+        return time.time() - self.checked_at >= self.interval
+
+    async def _fetch(self):
+        if not cache_backend.acquire_lease(f"image:{self.name}", FEED_LEASE_SECONDS):
+            # 其他 worker 負責向上游確認，這裡只讀共用快取
+            self.pull()
+            self.checked_at = time.time() - self.interval + min(self.interval, FEED_FOLLOW_SECONDS)
+            return
+        for url, headers, timeout in self.sources:
+            req_headers = dict(headers)
+            if url == self.source_url and self.body is not None:
+                if "etag" in self.validators:
+                    req_headers["If-None-Match"] = self.validators["etag"]
+                if "last-modified" in self.validators:
+                    req_headers["If-Modified-Since"] = self.validators["last-modified"]
+            try:
+                resp = await cwa_client.get(url, headers=req_headers, timeout=timeout)
+                if resp.status_code == 304:
+                    self.checked_at = time.time()
+                    self.publish()
+                    return
+                resp.raise_for_status()
+                if len(resp.content) > IMAGE_MAX_BYTES:
+                    raise ValueError(f"圖片過大（{len(resp.content)} bytes）")
+            except Exception as e:
+                print(f"[{self.name}] {url.split('?')[0]}：{e}")
+                continue
+            self.body       = resp.content
+            self.media_type = resp.headers.get("Content-Type", "image/png")
+            self.etag       = '"' + hashlib.blake2b(self.body, digest_size=16).hexdigest() + '"'
+            self.source_url = url
+            self.validators = {k: resp.headers[k] for k in ("etag", "last-modified") if k in resp.headers}
+            self.checked_at = time.time()
+            self.publish()
+            return
+        # 全部來源失敗：保留舊圖，稍後再試
+        self.checked_at = time.time() - self.interval + min(self.interval, FEED_RETRY_SECONDS)
+
+    def publish(self):
+        # 格式：一行 JSON 中繼資料 + 圖片原始 bytes
+        if cache_backend.shared and self.body is not None:
+            meta = orjson.dumps({"media_type": self.media_type, "etag": self.etag, "source_url": self.source_url,
+                                 "validators": self.validators, "checked_at": self.checked_at})
+            self.version = cache_backend.put(f"image:{self.name}", meta + b"\n" + self.body)
+
+    def pull(self):
+        entry = cache_backend.get(f"image:{self.name}", since=self.version)
+        if entry is None:
+            return
+        meta, _, body = bytes(entry[1]).partition(b"\n")
+        meta = orjson.loads(meta)
+        self.version    = entry[0]
+        self.body       = body
+        self.media_type = meta["media_type"]
+        self.etag       = meta["etag"]
+        self.source_url = meta["source_url"]
+        self.validators = meta["validators"]
+
+    async def refresh(self):
+        await singleflight.do(("image", self.name), self._fetch)
+
+    async def response(self, request: Request) -> Response:
+        metrics.count_cache(f"image:{self.name}", "miss" if self.body is None else "stale" if self.is_due else "hit")
+        if self.body is None:
+            await self.refresh()
+        elif self.is_due:
+            # 先回舊圖，背景更新
+            singleflight.start(("image", self.name), self._fetch)
+        if self.body is None:
+            return Response(status_code=502)
+
+        max_age = max(30, int(self.interval - (time.time() - self.checked_at)))
+        headers = {"ETag": self.etag, "Cache-Control": f"public, max-age={max_age}"}
+        inm = request.headers.get("if-none-match", "")
+        if inm and self.etag in (t.strip().removeprefix("W/") for t in inm.split(",")):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type=self.media_type, headers=headers)
+
+
+radar_image = CachedImage("radar", [
+    (f"{CWA_WEB_BASE}/Data/radar/CV1_3600.png", BROWSER_HEADERS, 12),
+], interval=5 * 60)   # 雷達回波每 10 分鐘發布
+
+rainfall_map_image = CachedImage("rainfall-map", [
+    (f"{CWA_API_BASE}/fileapi/v1/opendataapi/O-A0040-002?"
+     f"Authorization={CWA_API_KEY}&downloadType=WEB&format=png", BROWSER_HEADERS, 12),
+    (f"{RAINFALL_MAP_MIRROR}/map-data/O-A0040-002.jpg", {}, 10),
+], interval=10 * 60)
+
+
 @app.get("/api/radar-image")
-async def get_radar_image():
-    ts = int(time.time())
-    try:
-        resp = requests.get(f"https://www.cwa.gov.tw/Data/radar/CV1_3600.png?t={ts}",
-                            headers=BROWSER_HEADERS, timeout=12, verify=False)
-        resp.raise_for_status()
-        return Response(content=resp.content, media_type="image/png",
-                        headers={"Cache-Control": "no-store"})
-    except Exception as e:
-        print(f"[radar] {e}")
-        return Response(status_code=502)
+async def get_radar_image(request: Request):
+    return await radar_image.response(request)
 
 @app.get("/api/rainfall-map")
-async def get_rainfall_map():
-    url = (f"https://opendata.cwa.gov.tw/fileapi/v1/opendataapi/O-A0040-002?"
-           f"Authorization={CWA_API_KEY}&downloadType=WEB&format=png")
-    try:
-        resp = requests.get(url, headers=BROWSER_HEADERS, timeout=12, verify=False)
-        resp.raise_for_status()
-        return Response(content=resp.content, media_type=resp.headers.get("Content-Type", "image/png"),
-                        headers={"Cache-Control": "no-store"})
-    except Exception as e:
-        print(f"[rainfall-map] {e}")
-        try:
-            resp2 = requests.get("https://c1.1968services.tw/map-data/O-A0040-002.jpg", timeout=10, verify=False)
-            resp2.raise_for_status()
-            return Response(content=resp2.content, media_type="image/jpeg",
-                            headers={"Cache-Control": "no-store"})
-        except Exception:
-            return Response(status_code=502)
+async def get_rainfall_map(request: Request):
+    return await rainfall_map_image.response(request)
 
 
 # ─────────────────────────────────────────────
 # 雨量資料
 # ─────────────────────────────────────────────
+def _parse_rain_targets(spec: str) -> List[tuple]:
+    # 格式：「縣市:鄉鎮[:顯示名稱]」，以逗號分隔
+    targets = []
+    for part in spec.split(","):
+        fields = [f.strip() for f in part.split(":")]
+        if len(fields) >= 2 and fields[0] and fields[1]:
+            targets.append((fields[0], fields[1], fields[2] if len(fields) > 2 and fields[2] else fields[1]))
+    return targets
+
+
+RAIN_TARGETS = _parse_rain_targets(os.environ.get(
+    'RAIN_TARGETS', '宜蘭縣:蘇澳鎮,宜蘭縣:南澳鄉,花蓮縣:秀林鄉,花蓮縣:新城鄉'))
+RAIN_STATION_INDEX_SECONDS = 24 * 60 * 60   # 測站異動很少，每天重建一次索引
+RAIN_INFO_KEYS             = ("location", "mm", "class", "level", "time")
+# 記錄時序的累積雨量欄位 → 降採樣時同一時間格內的合併方式
+RAIN_HISTORY_FIELDS        = {"Past10Min": "sum", "Past1hr": "last", "Past24hr": "last"}
+
+
 async def get_cwa_rain_forecast() -> Dict[str, str]:
-    county_to_labels = {"宜蘭縣": ["蘇澳鎮", "南澳鄉"], "花蓮縣": ["秀林鄉", "新城鄉"]}
-    url = (f"https://opendata.cwa.gov.tw/api/v1/rest/datastore/F-C0032-001"
-           f"?Authorization={CWA_API_KEY}&locationName=宜蘭縣,花蓮縣")
+    county_to_labels: Dict[str, List[str]] = {}
+    for county, _, label in RAIN_TARGETS:
+        county_to_labels.setdefault(county, []).append(label)
+    url = (f"{CWA_API_BASE}/api/v1/rest/datastore/F-C0032-001"
+           f"?Authorization={CWA_API_KEY}&locationName={','.join(county_to_labels)}")
     forecasts: Dict[str, str] = {}
-    try:
-        r = requests.get(url, verify=False, timeout=15)
-        r.raise_for_status()
-        for loc in r.json().get("records", {}).get("location", []):
-            county = loc.get("locationName", "")
-            labels = county_to_labels.get(county, [])
-            if not labels:
-                continue
-            pop_el = next((el for el in loc.get("weatherElement", [])
-                           if el.get("elementName") == "PoP"), None)
-            if pop_el and pop_el.get("time"):
-                val_str = pop_el["time"][0]["parameter"]["parameterName"]
-                try:
-                    val = int(val_str)
-                    text = "無明顯降雨" if val <= 10 else f"{val}% 機率降雨"
-                except ValueError:
-                    text = val_str
-                for label in labels:
-                    forecasts[label] = text
-    except Exception as e:
-        print(f"[rain-forecast] {e}")
+    r = await cwa_client.get(url, timeout=15)
+    r.raise_for_status()
+    for loc in r.json().get("records", {}).get("location", []):
+        county = loc.get("locationName", "")
+        labels = county_to_labels.get(county, [])
+        if not labels:
+            continue
+        pop_el = next((el for el in loc.get("weatherElement", [])
+                       if el.get("elementName") == "PoP"), None)
+        if pop_el and pop_el.get("time"):
+            val_str = pop_el["time"][0]["parameter"]["parameterName"]
+            try:
+                val = int(val_str)
+                text = "無明顯降雨" if val <= 10 else f"{val}% 機率降雨"
+            except ValueError:
+                text = val_str
+            for label in labels:
+                forecasts[label] = text
     return forecasts
 
 
-async def get_cwa_rain_data() -> List[Dict[str, Any]]:
-    targets = [
-        ("宜蘭縣", "蘇澳鎮", "蘇澳鎮"), ("宜蘭縣", "南澳鄉", "南澳鄉"),
-        ("花蓮縣", "秀林鄉", "秀林鄉"), ("花蓮縣", "新城鄉", "新城鄉"),
-    ]
-    target_map    = {(c, t): label for c, t, label in targets}
-    display_order = [label for _, _, label in targets]
-    forecast_data = await get_cwa_rain_forecast()
+async def build_rain_station_index() -> Dict[str, Dict[str, List[str]]]:
+    # CountyName → TownName → StationId 清單（保留 CWA 回傳順序），只取地理欄位，資料量小
+    r = await cwa_client.get(
+        f"{CWA_API_BASE}/api/v1/rest/datastore/O-A0002-001"
+        f"?Authorization={CWA_API_KEY}&limit=2000&RainfallElement=Now&GeoInfo=CountyName,TownName",
+        timeout=20)
+    r.raise_for_status()
+    index: Dict[str, Dict[str, List[str]]] = {}
+    count = 0
+    for s in r.json().get("records", {}).get("Station", []):
+        geo = s.get("GeoInfo", {})
+        station_id = s.get("StationId")
+        if station_id:
+            towns = index.setdefault(geo.get("CountyName", ""), {})
+            towns.setdefault(geo.get("TownName", ""), []).append(station_id)
+            count += 1
+    if not index:
+        raise ValueError("O-A0002-001 測站清單為空")
+    print(f"[rain-stations] 索引已建立：{count} 站")
+    return index
+
+
+async def get_cwa_rain_data() -> Dict[str, Dict[str, Any]]:
+    index_feed = FEEDS["rain-stations"]
+    if index_feed.data is None:
+        await index_feed.refresh()
+    if index_feed.data is None:
+        raise RuntimeError(f"測站索引無法建立：{index_feed.error}")
+
+    label_stations = {label: index_feed.data.get(county, {}).get(town, [])
+                      for county, town, label in RAIN_TARGETS}
+    station_ids = [sid for ids in label_stations.values() for sid in ids]
     found: Dict[str, Any] = {}
+    if not station_ids:
+        return found
+
+    # 只查詢目標鄉鎮的測站
+    r = await cwa_client.get(
+        f"{CWA_API_BASE}/api/v1/rest/datastore/O-A0002-001"
+        f"?Authorization={CWA_API_KEY}&StationId={','.join(dict.fromkeys(station_ids))}"
+        f"&RainfallElement={','.join(RAIN_HISTORY_FIELDS)}&GeoInfo=CountyName,TownName",
+        timeout=20)
+    r.raise_for_status()
+    stations = {s.get("StationId"): s for s in r.json().get("records", {}).get("Station", [])}
+    for label, ids in label_stations.items():
+        # 與過去相同：取索引順序中第一個有回報的測站
+        s = next((stations[sid] for sid in ids if sid in stations), None)
+        if s is None:
+            continue
+        values = {}
+        for field in RAIN_HISTORY_FIELDS:
+            try:
+                values[field] = float(s.get("RainfallElement", {}).get(field, {}).get("Precipitation", "-1"))
+            except ValueError:
+                values[field] = -1.0
+        rain_val = values["Past24hr"]
+        try:
+            obs_dt = datetime.fromisoformat(s.get("ObsTime", {}).get("DateTime", "")).astimezone(TAIPEI_TZ)
+        except Exception:
+            obs_dt = None
+        level_text, css_class, _ = get_rain_level(rain_val)
+        found[label] = {
+            "location": label, "mm": rain_val, "class": css_class,
+            "level": level_text, "time": obs_dt.strftime("%H:%M") if obs_dt else "",
+            # 以下供雨量時序記錄，不放進儀表板回應
+            "station": s.get("StationId"), "obs": int(obs_dt.timestamp()) if obs_dt else None,
+            "values": values,
+        }
+    return found
 
-    try:
-        r = requests.get(
-            f"https://opendata.cwa.gov.tw/api/v1/rest/datastore/O-A0002-001"
-            f"?Authorization={CWA_API_KEY}&limit=2000",
-            verify=False, timeout=20)
-        r.raise_for_status()
-        for s in r.json().get("records", {}).get("Station", []):
-            geo   = s.get("GeoInfo", {})
-            label = target_map.get((geo.get("CountyName", ""), geo.get("TownName", "")))
-            if label and label not in found:
-                try:
-                    rain_val = float(s.get("RainfallElement", {}).get("Past24hr", {}).get("Precipitation", "-1"))
-                except ValueError:
-                    rain_val = -1.0
-                try:
-                    obs_time = (datetime.fromisoformat(s.get("ObsTime", {}).get("DateTime", ""))
-                                .astimezone(TAIPEI_TZ).strftime("%H:%M"))
-                except Exception:
-                    obs_time = ""
-                level_text, css_class, _ = get_rain_level(rain_val)
-                found[label] = {
-                    "location": label, "mm": rain_val, "class": css_class,
-                    "level": level_text, "time": obs_time,
-                    "forecast": forecast_data.get(label, "N/A"),
-                }
-    except Exception as e:
-        print(f"[rain] {e}")
 
+def compose_rain_info(found: Optional[Dict[str, Any]],
+                      forecast_data: Optional[Dict[str, str]]) -> List[Dict[str, Any]]:
+    # 觀測與預報各自有快照，回應時才合併
+    found         = found or {}
+    forecast_data = forecast_data or {}
     processed = []
-    for label in display_order:
-        processed.append(found[label] if label in found else {
+    for _, _, label in RAIN_TARGETS:
+        item = found.get(label)
+        item = {k: item[k] for k in RAIN_INFO_KEYS} if item else {
             "location": label, "mm": "N/A", "class": "rain-nodata",
             "level": "測站暫無回報", "time": "",
-            "forecast": forecast_data.get(label, "N/A"),
-        })
+        }
+        processed.append({**item, "forecast": forecast_data.get(label, "N/A")})
     return processed
 
 
 # ─────────────────────────────────────────────
-# 地震資料
+# 雨量時序：每個測站、每個欄位一個固定長度的環狀緩衝，查詢時不呼叫上游
 # ─────────────────────────────────────────────
-async def get_cwa_earthquake_data() -> List[Dict[str, Any]]:
-    url = (f"https://opendata.cwa.gov.tw/api/v1/rest/datastore/E-A0015-001"
-           f"?Authorization={CWA_API_KEY}&limit=30")
-    processed: List[Dict[str, Any]] = []
-    try:
-        r = requests.get(url, verify=False, timeout=15)
-        r.raise_for_status()
-        data = r.json()
-        if not (data.get("records") and data["records"].get("Earthquake")):
-            return processed
-        three_days_ago = datetime.now(TAIPEI_TZ) - timedelta(days=3)
-        for quake in data["records"]["Earthquake"]:
-            eq_info = quake.get("EarthquakeInfo", {})
-            quake_time_str = eq_info.get("OriginTime")
-            if not quake_time_str:
-                continue
-            quake_time = datetime.fromisoformat(quake_time_str).astimezone(TAIPEI_TZ)
-            if quake_time < three_days_ago:
+RAIN_HISTORY_HOURS    = int(os.environ.get('RAIN_HISTORY_HOURS', '72'))
+RAIN_HISTORY_CAPACITY = RAIN_HISTORY_HOURS * 6                       # O-A0002-001 每 10 分鐘一筆
+RAIN_RISING_DELTA_MM  = float(os.environ.get('RAIN_RISING_DELTA_MM', '2'))   # 時雨量比一小時前多這麼多即視為增強
+RAIN_HISTORY_PATH     = os.path.join(DATA_DIR, 'rain-history.json')
+
+
+class RainRing:
+    # 觀測時間（epoch 秒）與雨量各一個 array，寫滿後覆寫最舊的樣本；缺測存 NaN
+    __slots__ = ("times", "values", "head", "size")
+
+    def __init__(self, capacity: int):
+        self.times  = array("q", bytes(8 * capacity))
+        self.values = array("f", [math.nan]) * capacity
+        self.head   = 0   # 下一筆寫入的位置
+        self.size   = 0
+
+    @property
+    def last_time(self) -> int:
+        return self.times[self.head - 1] if self.size else 0
+
+    def append(self, ts: int, value: float) -> bool:
+        # 同一個觀測時間只記一次（資料源每次通知都會帶著目前的快照）
+        if self.size and ts <= self.last_time:
+            return False
+        self.times[self.head]  = ts
+        self.values[self.head] = value
+        self.head = (self.head + 1) % len(self.times)
+        self.size = min(self.size + 1, len(self.times))
+        return True
+
+    def samples(self, since: int = 0):
+        # 由舊到新
+        cap = len(self.times)
+        start = self.head - self.size
+        for i in range(start, self.head):
+            ts = self.times[i % cap]
+            if ts >= since:
+                yield ts, self.values[i % cap]
+
+    def latest(self, before: int) -> Optional[tuple]:
+        # before 之前（含）最新一筆有值的樣本
+        cap = len(self.times)
+        for i in range(self.head - 1, self.head - self.size - 1, -1):
+            ts, value = self.times[i % cap], self.values[i % cap]
+            if ts <= before and not math.isnan(value):
+                return ts, value
+        return None
+
+
+class RainHistory:
+    def __init__(self, path: str, capacity: int):
+        self.path     = path
+        self.capacity = capacity
+        self.rings: Dict[tuple, RainRing] = {}   # (StationId, 欄位) → RainRing
+        self.stations: Dict[str, str]     = {}   # 鄉鎮顯示名稱 → 目前採用的測站
+        self.revision = 0
+
+    def record(self, found: Dict[str, Any]) -> int:
+        added = 0
+        for label, item in found.items():
+            # 舊版快照或其他形狀的資料（沒有測站與觀測時間）不記錄
+            if not isinstance(item, dict) or not isinstance(item.get("values"), dict):
                 continue
-            levels = {"宜蘭縣": "0", "花蓮縣": "0", "台東縣": "0"}
-            for area in quake.get("Intensity", {}).get("ShakingArea", []):
-                desc = area.get("AreaDesc", "")
-                if desc in levels:
-                    levels[desc] = area.get("AreaIntensity", "0")
-            def to_int(s):
-                try: return int(s.replace("級", ""))
-                except: return 0
-            yi, hu, ta = to_int(levels["宜蘭縣"]), to_int(levels["花蓮縣"]), to_int(levels["台東縣"])
-            if max(yi, hu, ta) < 2:
+            station, obs = item.get("station"), item.get("obs")
+            if not station or not obs:
                 continue
-            epicenter = eq_info.get("Epicenter", {})
-            processed.append({
-                "time":          quake_time.strftime("%Y-%m-%d %H:%M"),
-                "location":      epicenter.get("Location", "不明"),
-                "magnitude":     eq_info.get("Magnitude", {}).get("MagnitudeValue", 0),
-                "depth":         eq_info.get("FocalDepth", 0),
-                "hualien_level": str(hu),
-                "yilan_level":   str(yi),
-                "taitung_level": str(ta),
-                "report_url":    quake.get("Web", ""),
+            self.stations[label] = station
+            for field in RAIN_HISTORY_FIELDS:
+                value = item["values"].get(field, -1.0)
+                added += self._ring(station, field).append(obs, value if value >= 0 else math.nan)
+        if added:
+            self.revision += 1
+            # 已不再採用、且樣本都超出視窗的測站整個移除
+            cutoff = max(r.last_time for r in self.rings.values()) - RAIN_HISTORY_HOURS * 3600
+            used = set(self.stations.values())
+            for key in [k for k, r in self.rings.items() if k[0] not in used and r.last_time < cutoff]:
+                del self.rings[key]
+        return added
+
+    def _ring(self, station: str, field: str) -> RainRing:
+        ring = self.rings.get((station, field))
+        if ring is None:
+            ring = self.rings[(station, field)] = RainRing(self.capacity)
+        return ring
+
+    def on_feed_change(self, feed: Feed):
+        # 抓取的 worker 與讀共用快取的 worker 都由這裡記錄，各自有完整的時序
+        if feed.name != "rain" or not isinstance(feed.data, dict) or not self.record(feed.data):
+            return
+        try:
+            asyncio.get_running_loop().create_task(self.save()).add_done_callback(_log_background_error)
+        except RuntimeError:
+            pass
+
+    def query(self, hours: int, step_minutes: int) -> Dict[str, Any]:
+        step = step_minutes * 60
+        end = max((r.last_time for r in self.rings.values()), default=0)
+        # 時間格以步長對齊，最後一格含最新樣本；資料不變時回應內容也不變
+        count = hours * 60 // step_minutes
+        first = end - end % step - (count - 1) * step
+        townships = []
+        for _, _, label in RAIN_TARGETS:
+            station = self.stations.get(label)
+            series = {}
+            for field, how in RAIN_HISTORY_FIELDS.items():
+                buckets: List[Optional[float]] = [None] * count
+                ring = self.rings.get((station, field))
+                for ts, value in (ring.samples(first) if ring else ()):
+                    if math.isnan(value):
+                        continue
+                    i = (ts - first) // step
+                    buckets[i] = round((buckets[i] or 0) + value if how == "sum" else value, 1)
+                series[field] = buckets
+            rate = previous = None
+            ring = self.rings.get((station, "Past1hr"))
+            latest = ring.latest(end) if ring else None
+            if latest:
+                rate = round(latest[1], 1)
+                # 一小時前的時雨量（容許少一兩筆樣本）
+                before = ring.latest(latest[0] - 3600)
+                if before and before[0] >= latest[0] - 3600 - 20 * 60:
+                    previous = round(before[1], 1)
+            townships.append({
+                "location": label, "station": station, "series": series,
+                "rate": rate, "previousRate": previous,
+                "rising": rate is not None and previous is not None and rate - previous >= RAIN_RISING_DELTA_MM,
             })
-    except Exception as e:
-        print(f"[earthquake] {e}")
-    return processed
+        fmt = lambda ts: datetime.fromtimestamp(ts, TAIPEI_TZ).strftime("%Y-%m-%d %H:%M")
+        return {
+            "updatedAt": fmt(end) if end else None, "hours": hours, "stepMinutes": step_minutes,
+            "times": [fmt(first + i * step) for i in range(count)] if end else [],
+            "townships": townships,
+        }
+
+    async def save(self):
+        rings = {f"{station}|{field}": [[ts, None if math.isnan(v) else v] for ts, v in ring.samples()]
+                 for (station, field), ring in self.rings.items()}
+        body = json.dumps({"stations": self.stations, "rings": rings}, ensure_ascii=False).encode("utf-8")
+        try:
+            await asyncio.to_thread(_atomic_write, self.path, body)
+        except OSError as e:
+            print(f"[rain-history] 寫入失敗：{e}")
+
+    def load(self):
+        # 重啟後沿用先前累積的時序；容量改變時只保留最新的樣本
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                snap = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"[rain-history] 讀取失敗：{e}")
+            return
+        self.stations.update(snap.get("stations", {}))
+        for key, samples in snap.get("rings", {}).items():
+            station, _, field = key.partition("|")
+            ring = self._ring(station, field)
+            for ts, value in samples:
+                ring.append(ts, math.nan if value is None else value)
+        self.revision += 1
+
+
+rain_history = RainHistory(RAIN_HISTORY_PATH, RAIN_HISTORY_CAPACITY)
+FEED_LISTENERS.append(rain_history.on_feed_change)
+rain_history_payload = PayloadCache()
+
+
+@app.get("/api/rain-history")
+async def get_rain_history(request: Request, hours: int = 24, step: int = 30):
+    # step 為降採樣的時間格（分鐘）：Past10Min 取格內總和，其餘累積欄位取格內最後一筆
+    hours = max(1, min(hours, RAIN_HISTORY_HOURS))
+    step  = max(10, min(step, hours * 60))
+    key = (rain_history.revision, hours, step)
+    return encoded_json_response(request, rain_history_payload.get(key, lambda: rain_history.query(hours, step)))
+
+
+# ─────────────────────────────────────────────
+# 地震資料
+# ─────────────────────────────────────────────
+EARTHQUAKE_WINDOW_HOURS      = 72
+EARTHQUAKE_FULL_SYNC_SECONDS = 60 * 60   # 定期重抓整個視窗，取得報告的修正與撤回
+EARTHQUAKE_LOOKBACK_SECONDS  = 60 * 60   # 群震時較早地震的報告可能晚於較晚地震發布，增量查詢往回多看一段
+EARTHQUAKE_AREAS             = ("宜蘭縣", "花蓮縣", "台東縣")
+
+# EarthquakeNo → {"time": 發震時間, "entry": 儀表板項目（三縣市皆未達 2 級則為 None）}
+earthquake_store: Dict[Any, Dict[str, Any]] = {}
+earthquake_hwm: Optional[datetime] = None     # 已收到的最新發震時間
+earthquake_full_sync_time = 0.0
+
+
+def _parse_earthquake(quake: Dict[str, Any]) -> Optional[tuple]:
+    # 回傳 (EarthquakeNo, 發震時間, 儀表板項目或 None)
+    eq_info = quake.get("EarthquakeInfo", {})
+    quake_time_str = eq_info.get("OriginTime")
+    if not quake_time_str:
+        return None
+    # OriginTime 為不帶時區的台灣時間；須與 timeFrom 同一時區，不能依主機時區解讀
+    quake_time = datetime.fromisoformat(quake_time_str)
+    quake_time = TAIPEI_TZ.localize(quake_time) if quake_time.tzinfo is None else quake_time.astimezone(TAIPEI_TZ)
+    levels = dict.fromkeys(EARTHQUAKE_AREAS, "0")
+    for area in quake.get("Intensity", {}).get("ShakingArea", []):
+        desc = area.get("AreaDesc", "")
+        if desc in levels:
+            levels[desc] = area.get("AreaIntensity", "0")
+    def to_int(s):
+        try: return int(s.replace("級", ""))
+        except: return 0
+    yi, hu, ta = to_int(levels["宜蘭縣"]), to_int(levels["花蓮縣"]), to_int(levels["台東縣"])
+    entry = None
+    if max(yi, hu, ta) >= 2:
+        epicenter = eq_info.get("Epicenter", {})
+        entry = {
+            "time":          quake_time.strftime("%Y-%m-%d %H:%M"),
+            "location":      epicenter.get("Location", "不明"),
+            "magnitude":     eq_info.get("Magnitude", {}).get("MagnitudeValue", 0),
+            "depth":         eq_info.get("FocalDepth", 0),
+            "hualien_level": str(hu),
+            "yilan_level":   str(yi),
+            "taitung_level": str(ta),
+            "report_url":    quake.get("Web", ""),
+        }
+    key = quake.get("EarthquakeNo") or (quake_time_str, quake.get("Web", ""))
+    return key, quake_time, entry
+
+
+async def _fetch_earthquakes(time_from: datetime) -> List[Dict[str, Any]]:
+    url = (f"{CWA_API_BASE}/api/v1/rest/datastore/E-A0015-001"
+           f"?Authorization={CWA_API_KEY}&timeFrom={time_from.strftime('%Y-%m-%dT%H:%M:%S')}")
+    r = await cwa_client.get(url, timeout=15)
+    r.raise_for_status()
+    return (r.json().get("records") or {}).get("Earthquake") or []
+
+
+async def get_cwa_earthquake_data() -> List[Dict[str, Any]]:
+    global earthquake_hwm, earthquake_full_sync_time
+    now = datetime.now(TAIPEI_TZ)
+    window_start = now - timedelta(hours=EARTHQUAKE_WINDOW_HOURS)
+
+    # 平常只抓最新一筆往前 EARTHQUAKE_LOOKBACK_SECONDS 之後的報告（重疊的部分以 EarthquakeNo 去重）；定期重抓整個視窗
+    full = earthquake_hwm is None or time.time() - earthquake_full_sync_time > EARTHQUAKE_FULL_SYNC_SECONDS
+    since = window_start if full else max(earthquake_hwm - timedelta(seconds=EARTHQUAKE_LOOKBACK_SECONDS), window_start)
+    quakes = await _fetch_earthquakes(since)
+    parsed = [p for p in map(_parse_earthquake, quakes) if p]
+    if full:
+        earthquake_store.clear()
+        earthquake_hwm = None
+        earthquake_full_sync_time = time.time()
+    added = 0
+    for key, quake_time, entry in parsed:
+        if key not in earthquake_store:
+            added += 1
+        earthquake_store[key] = {"time": quake_time, "entry": entry}
+        if earthquake_hwm is None or quake_time > earthquake_hwm:
+            earthquake_hwm = quake_time
+
+    for key in [k for k, v in earthquake_store.items() if v["time"] < window_start]:
+        del earthquake_store[key]
+    if added and not full:
+        print(f"[earthquake] 新增 {added} 筆地震報告")
+
+    items = sorted((v for v in earthquake_store.values() if v["entry"]), key=lambda v: v["time"], reverse=True)
+    return [v["entry"] for v in items]
 
 
 # ─────────────────────────────────────────────
 # 颱風資料
 # ─────────────────────────────────────────────
 async def get_cwa_typhoon_data() -> Optional[Dict[str, Any]]:
-    url = f"https://opendata.cwa.gov.tw/api/v1/rest/datastore/T-A0001-001?Authorization={CWA_API_KEY}"
-    try:
-        r = requests.get(url, verify=False, timeout=15)
-        r.raise_for_status()
-        warnings_data = (r.json().get("records", {})
-                         .get("sea_typhoon_warning", {})
-                         .get("typhoon_warning_summary", {})
-                         .get("SeaTyphoonWarning"))
-        if warnings_data:
-            t = warnings_data[0]
-            update_time = (datetime.fromisoformat(t["issue_time"])
-                           .astimezone(TAIPEI_TZ).strftime("%m-%d %H:%M"))
-            return {
-                "name": t["typhoon_name"], "warning_type": t["warning_type"],
-                "update_time": update_time, "location": t["center_location"],
-                "wind_speed": t["max_wind_speed"],
-                "status": t["warning_summary"]["content"],
-                "img_url": "https://www.cwa.gov.tw/Data/typhoon/TY_NEWS/TY_NEWS_0.jpg",
-            }
-    except Exception as e:
-        if getattr(getattr(e, 'response', None), 'status_code', None) != 404:
-            print(f"[typhoon] {e}")
+    url = f"{CWA_API_BASE}/api/v1/rest/datastore/T-A0001-001?Authorization={CWA_API_KEY}"
+    r = await cwa_client.get(url, timeout=15)
+    if r.status_code == 404:
+        # 無颱風警報時 CWA 回 404
+        return None
+    r.raise_for_status()
+    warnings_data = (r.json().get("records", {})
+                     .get("sea_typhoon_warning", {})
+                     .get("typhoon_warning_summary", {})
+                     .get("SeaTyphoonWarning"))
+    if warnings_data:
+        t = warnings_data[0]
+        update_time = (datetime.fromisoformat(t["issue_time"])
+                       .astimezone(TAIPEI_TZ).strftime("%m-%d %H:%M"))
+        return {
+            "name": t["typhoon_name"], "warning_type": t["warning_type"],
+            "update_time": update_time, "location": t["center_location"],
+            "wind_speed": t["max_wind_speed"],
+            "status": t["warning_summary"]["content"],
+            "img_url": "https://www.cwa.gov.tw/Data/typhoon/TY_NEWS/TY_NEWS_0.jpg",
+        }
     return None
 
 
 # ─────────────────────────────────────────────
 # 蘇花公路路況（TDX）
 # ─────────────────────────────────────────────
-def get_tdx_access_token() -> Optional[str]:
-    try:
-        r = requests.post(
-            "https://tdx.transportdata.tw/auth/realms/TDXConnect/protocol/openid-connect/token",
-            data={"grant_type": "client_credentials", "client_id": TDX_APP_ID, "client_secret": TDX_APP_KEY},
-            headers={"Content-Type": "application/x-www-form-urlencoded"}, timeout=10)
-        r.raise_for_status()
-        return r.json().get("access_token")
-    except Exception as e:
-        print(f"❌ TDX token 失敗: {e}")
+ROAD_SECTIONS = {
+    "蘇澳－南澳": ["蘇澳", "東澳", "蘇澳隧道", "東澳隧道", "東岳隧道"],
+    "南澳－和平": ["南澳", "武塔", "漢本", "和平", "觀音隧道", "谷風隧道"],
+    "和平－秀林": ["和平", "和仁", "崇德", "秀林", "中仁隧道", "和平隧道",
+                "和中隧道", "和中橋", "仁水隧道", "大清水隧道",
+                "錦文隧道", "匯德隧道", "崇德隧道", "清水斷崖", "下清水橋", "大清水"],
+}
+HIGH_RISK_KW  = ["封閉", "中斷", "坍方"]
+DOWNGRADE_KW  = ["改道", "替代道路", "行駛台9丁線", "單線雙向", "戒護通行", "放行"]
+MID_RISK_KW   = ["落石", "施工", "管制", "事故", "壅塞", "車多", "濃霧", "作業"]
+PARTIAL_KW    = ["單線", "單側", "車道", "非全路幅", "慢車道", "機動"]
+NEW_SUHUA_LMK = ["蘇澳隧道", "東澳隧道", "觀音隧道", "谷風隧道", "中仁隧道", "仁水隧道"]
+NEW_SUHUA_KM  = [(104, 113), (124, 145), (148, 160)]
+
+
+class TdxAuthError(Exception):
+    pass
+
+
+def road_error_sections(error: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    # 尚無任何成功快照時的佔位資料
+    if error and error.startswith("TDX 授權"):
+        status, desc = "認證失敗", "無法取得 TDX 授權"
+    else:
+        status, desc = "讀取失敗", "無法連線到 TDX 伺服器"
+    err = {"section": "全線", "status": status, "class": "road-red",
+           "desc": desc, "time": "", "is_old_road": False, "detail_url": ""}
+    return {name: [err] for name in ROAD_SECTIONS}
+
+
+TDX_TOKEN_URL            = f"{TDX_API_BASE}/auth/realms/TDXConnect/protocol/openid-connect/token"
+TDX_TOKEN_REFRESH_MARGIN = 30 * 60   # 到期前半小時於背景換發
+TDX_TOKEN_MIN_LIFETIME   = 60        # 剩餘壽命低於此值視為已過期
+
+
+class TdxTokenManager:
+    # TDX token 約可用一天：快取到期前背景換發，併發呼叫共用同一個換發請求
+    def __init__(self):
+        self.token: Optional[str] = None
+        self.expires_at = 0.0
+        self._refresher: Optional[asyncio.Task] = None
+
+    def _is_valid(self) -> bool:
+        return bool(self.token) and time.time() < self.expires_at - TDX_TOKEN_MIN_LIFETIME
+
+    async def get_token(self) -> str:
+        if self._is_valid():
+            return self.token
+        return await self.refresh()
+
+    async def refresh(self) -> str:
+        return await singleflight.do("tdx-token", self._fetch)
+
+    def invalidate(self):
+        self.token = None
+        self.expires_at = 0.0
+
+    async def _fetch(self) -> str:
+        try:
+            r = await http_client.post(
+                TDX_TOKEN_URL,
+                data={"grant_type": "client_credentials", "client_id": TDX_APP_ID, "client_secret": TDX_APP_KEY},
+                headers={"Content-Type": "application/x-www-form-urlencoded"}, timeout=10)
+            r.raise_for_status()
+            body = r.json()
+        except Exception as e:
+            print(f"❌ TDX token 失敗: {e}")
+            raise TdxAuthError("TDX 授權失敗") from e
+        token = body.get("access_token")
+        if not token:
+            raise TdxAuthError("TDX 授權失敗：回應缺少 access_token")
+        self.token      = token
+        self.expires_at = time.time() + float(body.get("expires_in", 3600))
+        self._schedule_refresh()
+        return token
+
+    def _schedule_refresh(self):
+        # 取消尚未觸發的排程；正在換發的 _refresh_later 已先清掉自己，不會在這裡被取消
+        if self._refresher and not self._refresher.done():
+            self._refresher.cancel()
+        delay = max(TDX_TOKEN_MIN_LIFETIME, self.expires_at - time.time() - TDX_TOKEN_REFRESH_MARGIN)
+        self._refresher = asyncio.create_task(self._refresh_later(delay))
+
+    async def _refresh_later(self, delay: float):
+        await asyncio.sleep(delay)
+        # 換發在 single-flight 的 task 內進行，成功後 _schedule_refresh 會排下一次；先放開自己以免被取消
+        self._refresher = None
+        try:
+            await self.refresh()
+        except TdxAuthError:
+            # 換發失敗就等下一次呼叫時再取
+            pass
+
+    def close(self):
+        if self._refresher and not self._refresher.done():
+            self._refresher.cancel()
+
+
+tdx_tokens = TdxTokenManager()
+
+
+async def tdx_get(url: str, **kwargs) -> httpx.Response:
+    # 401 代表 token 已失效：作廢後換發並重試一次
+    token = await tdx_tokens.get_token()
+    r = await http_client.get(url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+    if r.status_code == 401:
+        tdx_tokens.invalidate()
+        token = await tdx_tokens.refresh()
+        r = await http_client.get(url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+    return r
+
+
+class RoadNewsClassifier:
+    # 所有關鍵字與 km 樁號編成一個 trie 形式的 regex，一次掃描取得全部命中。
+    # 命中字串內含的較短關鍵字直接查表補上；跨越命中邊界的重疊關鍵字（如「大清水」接「清水斷崖」）
+    # 與從關鍵字內開始的樁號另外補查，結果等同對每個關鍵字做 `kw in content`。
+    KM_PATTERN = r'(\d+\.?\d*)[Kk]'
+
+    def __init__(self, sections: Dict[str, List[str]], high_risk: List[str], mid_risk: List[str],
+                 partial: List[str], downgrade: List[str], landmarks: List[str],
+                 km_ranges: List[tuple]):
+        self.sections  = [(name, frozenset(kws)) for name, kws in sections.items()]
+        self.high_risk = tuple(high_risk)
+        self.mid_risk  = tuple(mid_risk)
+        self.partial   = frozenset(partial)
+        self.downgrade = frozenset(downgrade)
+        self.landmarks = frozenset(landmarks)
+        self.km_ranges = list(km_ranges)
+
+        keywords = {"台9", "蘇花", "台9丁"}
+        keywords.update(high_risk, mid_risk, partial, downgrade, landmarks)
+        for kws in sections.values():
+            keywords.update(kws)
+        if any(re.match(r'[\d.Kk]', kw) for kw in keywords):
+            raise ValueError("關鍵字不可以數字、小數點或 K 開頭，會與 km 樁號比對衝突")
+
+        self._implied = {kw: frozenset(k for k in keywords if k in kw) for kw in keywords}
+        # kw → 可能從 kw 內部開始、並超出 kw 結尾的其他關鍵字（掃描時會被吃掉，需另外確認）
+        overlaps = {kw: [other for other in keywords
+                         if any(len(other) > n and kw.endswith(other[:n])
+                                for n in range(1, min(len(kw), len(other))))]
+                    for kw in keywords}
+        self._overlaps = {kw: others for kw, others in overlaps.items() if others}
+        # 含數字結尾的關鍵字（如「台9」）後面若緊接數字與 K，樁號會從關鍵字內部開始
+        km_prefix = re.compile(r'\d+(\.\d*)?')
+        self._km_tails = frozenset(kw for kw in keywords
+                                   if any(km_prefix.fullmatch(kw[i:]) for i in range(len(kw))))
+        self._km_regex = re.compile(self.KM_PATTERN)
+        # 開頭以字元集合先篩選位置，sre 可快速跳過不可能命中的字元
+        first_chars = "".join(sorted({re.escape(kw[0]) for kw in keywords}))
+        self._regex = re.compile(f"(?=[{first_chars}\\d])(?:({self._trie_regex(keywords)})|{self.KM_PATTERN})")
+
+    @classmethod
+    def _trie_regex(cls, words) -> str:
+        trie: Dict[str, Any] = {}
+        for w in sorted(words):
+            node = trie
+            for ch in w:
+                node = node.setdefault(ch, {})
+            node[""] = True
+        return cls._node_regex(trie)
+
+    @classmethod
+    def _node_regex(cls, node: Dict[str, Any]) -> str:
+        # 分支依序嘗試，較長的關鍵字優先
+        terminal = "" in node
+        branches = [re.escape(ch) + cls._node_regex(child) for ch, child in node.items() if ch != ""]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return "(?:" + body + ")?"
+        return body
+
+    def scan(self, text: str) -> tuple:
+        hits: set = set()
+        km = None
+        km_tail_hit = False
+        implied = self._implied
+        for kw, digits in self._regex.findall(text):
+            if not kw:
+                if km is None:
+                    km = digits
+                continue
+            hits |= implied[kw]
+            if kw in self._km_tails:
+                km_tail_hit = True
+            pending = self._overlaps.get(kw)
+            while pending:
+                # 重疊的關鍵字極少，直接以子字串確認
+                found = [other for other in pending if other not in hits and other in text]
+                pending = []
+                for other in found:
+                    hits |= implied[other]
+                    pending.extend(self._overlaps.get(other, ()))
+        if km_tail_hit:
+            # 最左邊的樁號可能被關鍵字吃掉，重新找一次
+            km_m = self._km_regex.search(text)
+            km = km_m.group(1) if km_m else None
+        return hits, km
+
+    def classify(self, title: str, desc: str) -> Optional[Dict[str, Any]]:
+        # 蘇花篩選沿用原本對 title + desc 的判斷，非蘇花新聞不必掃描
+        joined = title + desc
+        if not desc or not ("台9" in joined or "蘇花" in joined):
+            return None
+        hits, km_str = self.scan(f"{title}：{desc}")
+
+        status = "事件"; css_class = "road-yellow"
+        high = next((kw for kw in self.high_risk if kw in hits), None)
+        if high:
+            status = high; css_class = "road-red"
+            if hits & self.partial:
+                status = f"管制（{status}單線）"; css_class = "road-yellow"
+            elif hits & self.downgrade:
+                status = f"管制（{status}改道）"; css_class = "road-yellow"
+        else:
+            status = next((kw for kw in self.mid_risk if kw in hits), status)
+
+        is_old = False
+        if not hits & self.landmarks:
+            if km_str is not None:
+                try:
+                    km = float(km_str)
+                    is_old = not any(lo <= km <= hi for lo, hi in self.km_ranges)
+                except ValueError:
+                    is_old = "台9丁" in hits
+            else:
+                is_old = "台9丁" in hits
+
+        section = next((name for name, kws in self.sections if hits & kws), "其他蘇花路段")
+        return {"section": section, "status": status, "class": css_class, "is_old_road": is_old}
+
+
+road_classifier = RoadNewsClassifier(ROAD_SECTIONS, HIGH_RISK_KW, MID_RISK_KW, PARTIAL_KW,
+                                     DOWNGRADE_KW, NEW_SUHUA_LMK, NEW_SUHUA_KM)
+
+
+def classify_road_news(news: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # 非蘇花路段或無內文的新聞回傳 None
+    title = news.get("Title", "")
+    desc  = news.get("Description", "")
+    result = road_classifier.classify(title, desc)
+    if result is None:
         return None
 
-async def get_suhua_road_data() -> Dict[str, List[Dict[str, Any]]]:
-    global cached_road_data, last_fetch_time
-    if cached_road_data and (time.time() - last_fetch_time < CACHE_DURATION_SECONDS):
-        return cached_road_data
-
-    sections = {
-        "蘇澳－南澳": ["蘇澳", "東澳", "蘇澳隧道", "東澳隧道", "東岳隧道"],
-        "南澳－和平": ["南澳", "武塔", "漢本", "和平", "觀音隧道", "谷風隧道"],
-        "和平－秀林": ["和平", "和仁", "崇德", "秀林", "中仁隧道", "和平隧道",
-                    "和中隧道", "和中橋", "仁水隧道", "大清水隧道",
-                    "錦文隧道", "匯德隧道", "崇德隧道", "清水斷崖", "下清水橋", "大清水"],
+    try:
+        upd = datetime.fromisoformat(news.get("UpdateTime", "").replace("Z", "+00:00")).astimezone(TAIPEI_TZ)
+        pub = datetime.fromisoformat(news.get("PublishTime", "").replace("Z", "+00:00")).astimezone(TAIPEI_TZ)
+        time_str = f"更新：{upd.strftime('%m-%d %H:%M')}（首發：{pub.strftime('%m-%d %H:%M')}）"
+    except:
+        time_str = ""
+
+    return {
+        "section": result["section"], "status": result["status"], "class": result["class"],
+        "desc": f"【{title}】{desc}", "time": time_str,
+        "is_old_road": result["is_old_road"], "detail_url": news.get("NewsURL", ""),
     }
-    high_risk_kw  = ["封閉", "中斷", "坍方"]
-    downgrade_kw  = ["改道", "替代道路", "行駛台9丁線", "單線雙向", "戒護通行", "放行"]
-    mid_risk_kw   = ["落石", "施工", "管制", "事故", "壅塞", "車多", "濃霧", "作業"]
-    partial_kw    = ["單線", "單側", "車道", "非全路幅", "慢車道", "機動"]
-    new_suhua_lmk = ["蘇澳隧道", "東澳隧道", "觀音隧道", "谷風隧道", "中仁隧道", "仁水隧道"]
-    new_suhua_km  = [(104, 113), (124, 145), (148, 160)]
-
-    results = {name: [] for name in sections}
-    token = get_tdx_access_token()
-    if not token:
-        err = {"section": "全線", "status": "認證失敗", "class": "road-red",
-               "desc": "無法取得 TDX 授權", "time": "", "is_old_road": False, "detail_url": ""}
-        for name in sections: results[name].append(err)
-        return results
 
-    try:
-        r = requests.get(
-            "https://tdx.transportdata.tw/api/basic/v2/Road/Traffic/Live/News/Highway"
-            "?$orderby=PublishTime desc&$top=150&$format=JSON",
-            headers={"Authorization": f"Bearer {token}"}, timeout=15)
-        r.raise_for_status()
-        suhua_news = [
-            n for n in r.json().get("Newses", [])
-            if "台9" in (n.get("Title", "") + n.get("Description", "")) or
-               "蘇花" in (n.get("Title", "") + n.get("Description", ""))
-        ]
 
-        for news in suhua_news:
-            title   = news.get("Title", "")
-            desc    = news.get("Description", "")
-            content = f"{title}：{desc}"
-            if not desc: continue
+# ─────────────────────────────────────────────
+# 路況增量同步：以 NewsID 為鍵保存視窗內的新聞，只抓 UpdateTime 超過高水位的項目
+# ─────────────────────────────────────────────
+TDX_NEWS_URL           = f"{TDX_API_BASE}/api/basic/v2/Road/Traffic/Live/News/Highway"
+ROAD_NEWS_WINDOW       = 150
+ROAD_FULL_SYNC_SECONDS = 60 * 60   # 每小時做一次完整同步作為保險
 
-            try:
-                upd = datetime.fromisoformat(news.get("UpdateTime", "").replace("Z", "+00:00")).astimezone(TAIPEI_TZ)
-                pub = datetime.fromisoformat(news.get("PublishTime", "").replace("Z", "+00:00")).astimezone(TAIPEI_TZ)
-                time_str = f"更新：{upd.strftime('%m-%d %H:%M')}（首發：{pub.strftime('%m-%d %H:%M')}）"
-            except:
-                time_str = ""
-
-            status = "事件"; css_class = "road-yellow"; is_high = False
-            for kw in high_risk_kw:
-                if kw in content:
-                    status = kw; css_class = "road-red"; is_high = True; break
-            if not is_high:
-                for kw in mid_risk_kw:
-                    if kw in content: status = kw; break
-            if is_high:
-                if any(k in content for k in partial_kw):
-                    status = f"管制（{status}單線）"; css_class = "road-yellow"
-                elif any(k in content for k in downgrade_kw):
-                    status = f"管制（{status}改道）"; css_class = "road-yellow"
-
-            is_old = False
-            if not any(lmk in content for lmk in new_suhua_lmk):
-                km_m = re.search(r'(\d+\.?\d*)[Kk]', content)
-                if km_m:
-                    try:
-                        km = float(km_m.group(1))
-                        is_old = not any(lo <= km <= hi for lo, hi in new_suhua_km)
-                    except: is_old = "台9丁" in content
-                else: is_old = "台9丁" in content
-
-            classified = False
-            for sname, keywords in sections.items():
-                if any(kw in content for kw in keywords):
-                    results[sname].append({
-                        "section": sname, "status": status, "class": css_class,
-                        "desc": f"【{title}】{desc}", "time": time_str,
-                        "is_old_road": is_old, "detail_url": news.get("NewsURL", ""),
-                    })
-                    classified = True; break
-            if not classified:
-                results.setdefault("其他蘇花路段", []).append({
-                    "section": "其他蘇花路段", "status": status, "class": css_class,
-                    "desc": f"【{title}】{desc}", "time": time_str,
-                    "is_old_road": is_old, "detail_url": news.get("NewsURL", ""),
-                })
-
-        cached_road_data = results
-        last_fetch_time  = time.time()
+# NewsID → {"update": UpdateTime, "publish": PublishTime, "entry": 分類結果或 None}
+road_news_store: Dict[str, Dict[str, Any]] = {}
+road_news_hwm: Optional[str] = None
+road_full_sync_time = 0.0
 
-    except Exception as e:
-        print(f"❌ TDX 路況失敗: {e}")
-        err = {"section": "全線", "status": "讀取失敗", "class": "road-red",
-               "desc": "無法連線到 TDX 伺服器", "time": "", "is_old_road": False, "detail_url": ""}
-        for name in sections: results[name].append(err)
 
+def _tdx_news_url(filter_expr: Optional[str] = None, select: Optional[str] = None) -> str:
+    query = f"$orderby=PublishTime desc&$top={ROAD_NEWS_WINDOW}&$format=JSON"
+    if filter_expr:
+        query += f"&$filter={quote(filter_expr)}"
+    if select:
+        query += f"&$select={select}"
+    return f"{TDX_NEWS_URL}?{query}"
+
+
+async def _fetch_tdx_news(filter_expr: Optional[str] = None, select: Optional[str] = None) -> List[Dict[str, Any]]:
+    r = await tdx_get(_tdx_news_url(filter_expr, select), timeout=15)
+    r.raise_for_status()
+    return r.json().get("Newses", [])
+
+
+def _ingest_road_news(newses: List[Dict[str, Any]]) -> int:
+    changed = 0
+    for news in newses:
+        news_id = news.get("NewsID")
+        if not news_id:
+            continue
+        update = news.get("UpdateTime", "")
+        cur = road_news_store.get(news_id)
+        if cur and cur["update"] == update:
+            continue
+        road_news_store[news_id] = {
+            "update":  update,
+            "publish": news.get("PublishTime", ""),
+            "entry":   classify_road_news(news),
+        }
+        changed += 1
+    return changed
+
+
+async def _sync_road_news():
+    global road_news_hwm, road_full_sync_time
+
+    full = road_news_hwm is None or time.time() - road_full_sync_time > ROAD_FULL_SYNC_SECONDS
+    if not full:
+        changes, live = await asyncio.gather(
+            # ge：UpdateTime 只到秒，與高水位同一秒的修改也要取得；沒變的邊界項目由 _ingest_road_news 略過
+            _fetch_tdx_news(filter_expr=f"UpdateTime ge {road_news_hwm}"),
+            _fetch_tdx_news(select="NewsID"),
+        )
+        live_ids = {n.get("NewsID") for n in live}
+        change_ids = {n.get("NewsID") for n in changes}
+        # 變動數塞滿視窗，或視窗內出現未曾看過的項目 → 退回完整同步
+        if len(changes) >= ROAD_NEWS_WINDOW or any(i not in road_news_store and i not in change_ids
+                                                   for i in live_ids):
+            full = True
+
+    if full:
+        newses = await _fetch_tdx_news()
+        live_ids = {n.get("NewsID") for n in newses}
+        changed = _ingest_road_news(newses)
+        road_full_sync_time = time.time()
+    else:
+        changed = _ingest_road_news(changes)
+
+    expired = [i for i in road_news_store if i not in live_ids]
+    for news_id in expired:
+        del road_news_store[news_id]
+
+    updates = [v["update"] for v in road_news_store.values() if v["update"]]
+    road_news_hwm = max(updates) if updates else None
+    if changed or expired:
+        print(f"[road] {'完整' if full else '增量'}同步：{changed} 筆更新，{len(expired)} 筆移除")
+
+
+async def get_suhua_road_data() -> Dict[str, List[Dict[str, Any]]]:
+    await _sync_road_news()
+    results = {name: [] for name in ROAD_SECTIONS}
+    for item in sorted(road_news_store.values(), key=lambda v: v["publish"], reverse=True):
+        entry = item["entry"]
+        if entry:
+            results.setdefault(entry["section"], []).append(entry)
     return results
 
 
+# ─────────────────────────────────────────────
+# 資料源排程註冊
+# ─────────────────────────────────────────────
+register_feed("rain-stations", build_rain_station_index, RAIN_STATION_INDEX_SECONDS)
+register_feed("rain",          get_cwa_rain_data,       RAIN_REFRESH_SECONDS)
+register_feed("rain-forecast", get_cwa_rain_forecast,   FORECAST_REFRESH_SECONDS)
+register_feed("earthquake",    get_cwa_earthquake_data, EARTHQUAKE_REFRESH_SECONDS)
+register_feed("typhoon",       get_cwa_typhoon_data,    TYPHOON_REFRESH_SECONDS)
+register_feed("road",          get_suhua_road_data,     CACHE_DURATION_SECONDS)
+if GOOGLE_SA_JSON:
+    register_feed("hospital",  load_hospital_data,      HOSPITAL_CACHE_SECONDS)
+
+
 # ─────────────────────────────────────────────
 # 根路由
 # ─────────────────────────────────────────────
@@ -594,6 +2568,11 @@ def read_root():
 def read_root_head():
     return Response(status_code=200)
 
+@app.get("/metrics")
+def get_metrics():
+    # 指標為各 worker 各自累計
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # ─────────────────────────────────────────────
 # LINE Bot
 # ─────────────────────────────────────────────
@@ -603,60 +2582,213 @@ import hmac, hashlib, base64
 LINE_TOKEN  = os.environ.get('LINE_CHANNEL_TOKEN', '')
 LINE_SECRET = os.environ.get('LINE_CHANNEL_SECRET', '')
 
-detected_group_ids = []
 LINE_GROUP_ID = os.environ.get('LINE_GROUP_ID', 'Ce1dcf2f5cb1a781fb1af16402aa17853')
 
+LINE_WEBHOOK_QUEUE_SIZE = 1000
+LINE_EVENT_DEDUPE_TTL   = 24 * 3600   # LINE 重送的事件在這段時間內只處理一次
+
+
+class LineWebhookQueue:
+    # webhook 驗章後立即回應，事件交給背景處理
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+
+    def start(self) -> List[asyncio.Task]:
+        self.queue = asyncio.Queue(maxsize=LINE_WEBHOOK_QUEUE_SIZE)
+        return [asyncio.create_task(self._worker(), name="line-webhook")]
+
+    def submit(self, body: bytes) -> bool:
+        try:
+            self.queue.put_nowait(body)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def _worker(self):
+        while True:
+            body = await self.queue.get()
+            try:
+                for event in orjson.loads(body).get('events', []):
+                    handle_line_event(event)
+            except Exception as e:
+                print(f"[LINE] webhook 事件處理失敗：{e}")
+            finally:
+                self.queue.task_done()
+
+
+def handle_line_event(event: Dict[str, Any]):
+    event_id = event.get('webhookEventId')
+    if event_id and not cache_backend.claim_once(f"line-event:{event_id}", LINE_EVENT_DEDUPE_TTL):
+        return
+    source = event.get('source', {})
+    if source.get('type') == 'group':
+        gid = source.get('groupId', '')
+        if gid and cache_backend.add_member("line-group-ids", gid):
+            print(f"[LINE] 偵測到群組 ID：{gid}")
+
+
+line_webhook_queue = LineWebhookQueue()
+
+
 @app.post("/webhook")
 async def line_webhook(request: Request):
     body_bytes = await request.body()
-    body_str   = body_bytes.decode('utf-8')
 
     signature = request.headers.get('X-Line-Signature', '')
     hash_val  = hmac.new(LINE_SECRET.encode(), body_bytes, hashlib.sha256).digest()
     expected  = base64.b64encode(hash_val).decode()
-    if signature != expected:
+    if not hmac.compare_digest(signature.encode(), expected.encode()):
         return Response(status_code=403)
 
-    import json
-    data = json.loads(body_str)
-    for event in data.get('events', []):
-        source = event.get('source', {})
-        if source.get('type') == 'group':
-            gid = source.get('groupId', '')
-            if gid and gid not in detected_group_ids:
-                detected_group_ids.append(gid)
-                print(f"[LINE] 偵測到群組 ID：{gid}")
-
+    if not line_webhook_queue.submit(body_bytes):
+        print("[LINE] webhook 佇列已滿，略過此批事件")
     return {"status": "ok"}
 
 
 @app.get("/api/line-groupids")
 async def get_group_ids():
-    return {"group_ids": detected_group_ids}
+    return {"group_ids": cache_backend.members("line-group-ids")}
 
 
-@app.post("/api/line-notify")
-async def line_notify(request: Request):
-    if not LINE_TOKEN:
-        return {"error": "LINE_CHANNEL_TOKEN 未設定"}
-
-    data          = await request.json()
-    hospital      = data.get('hospital', '')
-    task_type     = data.get('task_type', '')
-    notes         = data.get('notes', '')
-    time_str      = data.get('time_str', '')
-    dashboard_url = data.get('dashboard_url', '')
-    eta_text      = data.get('eta_text', '')          # 新增：ETA 文字
-    webex_link    = data.get('webex_link', DEFAULT_WEBEX_LINK)  # 新增：眼鏡連結
-    group_id      = data.get('group_id', '') or LINE_GROUP_ID
-
-    if not group_id:
-        return {"error": "group_id 未提供"}
-
-    # ── 縮短 dashboard URL ──
-    short_url = shorten_url(dashboard_url) if dashboard_url else dashboard_url
+# ─────────────────────────────────────────────
+# LINE 推播佇列：API 立即回傳 job_id，由背景 worker 縮網址、送出並重試
+# ─────────────────────────────────────────────
+LINE_PUSH_URL      = f"{LINE_API_BASE}/v2/bot/message/push"
+LINE_WORKERS       = int(os.environ.get('LINE_WORKERS', '2'))     # 同時送出的訊息數
+LINE_QUEUE_SIZE    = int(os.environ.get('LINE_QUEUE_SIZE', '200'))
+LINE_MAX_ATTEMPTS  = 5
+LINE_BACKOFF_BASE  = 1.0     # 秒，每次重試加倍
+LINE_BACKOFF_MAX   = 60.0
+LINE_JOBS_KEPT     = 500     # 保留最近的 job 狀態供查詢
+
+
+class LineJob:
+    def __init__(self, group_id: str, data: Dict[str, Any]):
+        self.id         = str(uuid.uuid4())   # LINE 的 X-Line-Retry-Key 須為帶連字號的 UUID
+        self.group_id   = group_id
+        self.data       = data
+        self.status     = "queued"     # queued / sending / retrying / sent / failed
+        self.attempts   = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"job_id": self.id, "status": self.status, "attempts": self.attempts, "error": self.error,
+                "created_at": self.created_at, "updated_at": self.updated_at}
+
+
+class LineDispatcher:
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        self.jobs: "OrderedDict[str, LineJob]" = OrderedDict()
+
+    def start(self) -> List[asyncio.Task]:
+        self.queue = asyncio.Queue(maxsize=LINE_QUEUE_SIZE)
+        return [asyncio.create_task(self._worker(), name=f"line:{i}") for i in range(LINE_WORKERS)]
+
+    def submit(self, group_id: str, data: Dict[str, Any]) -> Optional[LineJob]:
+        job = LineJob(group_id, data)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return None
+        self.jobs[job.id] = job
+        while len(self.jobs) > LINE_JOBS_KEPT:
+            self.jobs.popitem(last=False)
+        self._update(job, "queued")
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        # 多 worker 時可能由其他 process 受理
+        entry = cache_backend.get(f"line-job:{job_id}")
+        return orjson.loads(entry[1]) if entry else None
+
+    def _update(self, job: LineJob, status: str, error: Optional[str] = None):
+        job.status, job.error, job.updated_at = status, error, time.time()
+        if cache_backend.shared:
+            cache_backend.put(f"line-job:{job.id}", orjson.dumps(job.to_dict()))
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._deliver(job)
+            except Exception as e:
+                self._update(job, "failed", str(e))
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, job: LineJob):
+        dashboard_url = job.data.get('dashboard_url', '')
+        short_url = await shorten_url(dashboard_url) if dashboard_url else dashboard_url
+        message_text = build_line_message(job.data, short_url)
+
+        while True:
+            job.attempts += 1
+            self._update(job, "sending")
+            retry_after = None
+            try:
+                resp = await http_client.post(
+                    LINE_PUSH_URL,
+                    headers={
+                        "Authorization":   f"Bearer {LINE_TOKEN}",
+                        "Content-Type":    "application/json",
+                        "X-Line-Retry-Key": job.id,   # 重試時 LINE 端不會重複發送
+                    },
+                    json={
+                        "to": job.group_id,
+                        "messages": [{"type": "text", "text": message_text}],
+                    },
+                    timeout=10,
+                )
+            except CircuitOpenError as e:
+                # 斷路器開啟時請求沒有送到 LINE，不算一次嘗試；等到斷路器半開再送，
+                # 否則 LINE 短暫故障恢復後，剩下的重試次數會在斷路器開啟期間被立即用完
+                job.attempts -= 1
+                breaker = circuit_breakers.get(upstream_site(LINE_PUSH_URL))
+                self._update(job, "retrying", str(e))
+                await asyncio.sleep(max(breaker.open_until - time.time() if breaker else 0, 1.0))
+                continue
+            except httpx.HTTPError as e:
+                error = str(e) or type(e).__name__
+            else:
+                # 409：同一個 retry key 先前已被接受
+                if resp.status_code in (200, 409):
+                    self._update(job, "sent")
+                    return
+                error = f"{resp.status_code} {resp.text}"
+                if resp.status_code != 429 and resp.status_code < 500:
+                    print(f"[LINE] 發訊息失敗：{error}")
+                    self._update(job, "failed", error)
+                    return
+                retry_after = resp.headers.get("Retry-After")
+
+            if job.attempts >= LINE_MAX_ATTEMPTS:
+                print(f"[LINE] 發訊息失敗（已重試 {job.attempts} 次）：{error}")
+                self._update(job, "failed", error)
+                return
+            delay = min(LINE_BACKOFF_MAX, LINE_BACKOFF_BASE * 2 ** (job.attempts - 1))
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            self._update(job, "retrying", error)
+            await asyncio.sleep(delay)
+
+
+line_dispatcher = LineDispatcher()
+
+
+def build_line_message(data: Dict[str, Any], short_url: str) -> str:
+    hospital   = data.get('hospital', '')
+    task_type  = data.get('task_type', '')
+    notes      = data.get('notes', '')
+    time_str   = data.get('time_str', '')
+    eta_text   = data.get('eta_text', '')          # 新增：ETA 文字
+    webex_link = data.get('webex_link', DEFAULT_WEBEX_LINK)  # 新增：眼鏡連結
 
-    # ── 組合 LINE 訊息 ──
     lines = [
         "🚑 台大兒童醫院 出勤通知",
         "",
@@ -687,25 +2819,29 @@ async def line_notify(request: Request):
         webex_link,
     ]
 
-    message_text = "\n".join(lines)
+    return "\n".join(lines)
 
-    try:
-        resp = requests.post(
-            "https://api.line.me/v2/bot/message/push",
-            headers={
-                "Authorization": f"Bearer {LINE_TOKEN}",
-                "Content-Type":  "application/json",
-            },
-            json={
-                "to": group_id,
-                "messages": [{"type": "text", "text": message_text}],
-            },
-            timeout=10,
-        )
-        if resp.status_code == 200:
-            return {"status": "sent"}
-        else:
-            print(f"[LINE] 發訊息失敗：{resp.status_code} {resp.text}")
-            return {"error": resp.text}
-    except Exception as e:
-        return {"error": str(e)}
+
+@app.post("/api/line-notify")
+async def line_notify(request: Request):
+    if not LINE_TOKEN:
+        return {"error": "LINE_CHANNEL_TOKEN 未設定"}
+
+    data     = await request.json()
+    group_id = data.get('group_id', '') or LINE_GROUP_ID
+
+    if not group_id:
+        return {"error": "group_id 未提供"}
+
+    job = line_dispatcher.submit(group_id, data)
+    if job is None:
+        return {"error": "通知佇列已滿，請稍後再試"}
+    return {"status": "queued", "job_id": job.id}
+
+
+@app.get("/api/line-notify/{job_id}")
+async def line_notify_status(job_id: str):
+    status = line_dispatcher.get(job_id)
+    if status is None:
+        return JSONResponse({"error": "找不到此通知"}, status_code=404)
+    return status
@@ -39,15 +39,20 @@ document.addEventListener('DOMContentLoaded', () => {
 
   function loadImages() {
     const ts = Date.now();
-    radarImage.src = `https://www.cwa.gov.tw/Data/radar/CV1_3600.png?t=${ts}`;
-    rainfallMapImage.src = `https://c1.1968services.tw/map-data/O-A0040-002.jpg?t=${ts}`;
+    // 經後端快取代理取圖；以 5 分鐘為單位變更網址，同一時段內瀏覽器可直接用快取 / 304
+    const bucket = Math.floor(ts / 300000);
+    radarImage.src = `${BACKEND_URL}/api/radar-image?v=${bucket}`;
+    rainfallMapImage.src = `${BACKEND_URL}/api/rainfall-map?v=${bucket}`;
     radarImage.onerror = () => {
-      radarImage.onerror = null;
-      radarImage.src = `https://www.cwa.gov.tw/Data/radar/CV2_3600.png?t=${ts}`;
-      radarImage.onerror = () => { radarImage.alt = '⚠️ 氣象局雷達圖暫時無法載入'; };
+      radarImage.onerror = () => {
+        radarImage.onerror = () => { radarImage.alt = '⚠️ 氣象局雷達圖暫時無法載入'; };
+        radarImage.src = `https://www.cwa.gov.tw/Data/radar/CV2_3600.png?t=${ts}`;
+      };
+      radarImage.src = `https://www.cwa.gov.tw/Data/radar/CV1_3600.png?t=${ts}`;
     };
     rainfallMapImage.onerror = () => {
-      rainfallMapImage.alt = '⚠️ 累積雨量圖暫時無法載入';
+      rainfallMapImage.onerror = () => { rainfallMapImage.alt = '⚠️ 累積雨量圖暫時無法載入'; };
+      rainfallMapImage.src = `https://c1.1968services.tw/map-data/O-A0040-002.jpg?t=${ts}`;
     };
   }
 
@@ -199,5 +204,26 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  // 即時推播：後端只送有變動的區塊，收到後更新對應的區域
+  function connectStream() {
+    if (!window.EventSource || !BACKEND_URL || BACKEND_URL === 'YOUR_RENDER_URL_HERE') return;
+    const renderers = {
+      rainInfo:       (v) => renderRain(v || []),
+      earthquakeInfo: (v) => renderEarthquake(v || []),
+      roadInfo:       (v) => renderRoad(v || {}),
+      typhoonInfo:    (v) => renderTyphoon(v),
+    };
+    const source = new EventSource(BACKEND_URL + '/api/stream');
+    Object.entries(renderers).forEach(([section, render]) => {
+      source.addEventListener(section, (e) => {
+        const msg = JSON.parse(e.data);
+        lastUpdateElement.textContent = `資料最後更新時間：${msg.lastUpdate}`;
+        render(msg.data);
+      });
+    });
+    // 斷線時瀏覽器會自動重連，重連後後端先送完整狀態
+  }
+
   fetchDataAndUpdateDashboard();
+  connectStream();
 });